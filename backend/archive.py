@@ -0,0 +1,120 @@
+"""오래된 거절/취소 매칭 요청을 보관 테이블로 옮기고 DB 를 정리한다
+
+    python archive.py                       # MATCH_ARCHIVE_AFTER_DAYS 보다 오래된 요청 보관
+    python archive.py --older-than-days 7
+    python archive.py --vacuum              # 기존 DB 를 incremental auto_vacuum 으로 전환 (전체 VACUUM)
+
+서버에서는 lifespan 이 같은 작업을 MATCH_ARCHIVE_INTERVAL 초마다 백그라운드로 실행한다.
+끝난 요청이 빠지면 중복/대기 검사와 목록 조회가 보는 match_requests 가 작게 유지되고,
+보관된 요청은 목록 API 의 include_archived=true 로 볼 수 있다.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from db import DB_PATH, open_connection, immediate_transaction
+from migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = float(os.environ.get("MATCH_ARCHIVE_AFTER_DAYS", "30"))
+# 0 이면 서버의 백그라운드 보관 작업을 끈다 (cron 으로 archive.py 실행 등)
+ARCHIVE_INTERVAL = float(os.environ.get("MATCH_ARCHIVE_INTERVAL", "3600"))
+# 한 트랜잭션에서 옮기는 요청 수. 배치 사이에 다른 쓰기가 끼어들 수 있다
+ARCHIVE_BATCH_SIZE = 1000
+# 한 번에 파일에서 반환하는 빈 페이지 수
+VACUUM_PAGES = 1000
+
+
+def archive_batch(conn, cutoff, batch_size=ARCHIVE_BATCH_SIZE):
+    """cutoff(유닉스 시각) 전에 끝난 요청을 최대 batch_size 개 옮기고 옮긴 수를 반환한다."""
+    with immediate_transaction(conn):
+        # idx_match_requests_terminal (같은 status 조건의 부분 인덱스)
+        ids = [
+            row[0] for row in conn.execute(
+                "SELECT id FROM match_requests WHERE status IN ('rejected', 'cancelled') AND status_changed_at < ? "
+                "ORDER BY status_changed_at LIMIT ?",
+                (cutoff, batch_size),
+            )
+        ]
+        if not ids:
+            return 0
+        placeholders = ", ".join("?" for _ in ids)
+        conn.execute(
+            "INSERT INTO match_requests_archive (id, mentor_id, mentee_id, message, status, status_changed_at, archived_at) "
+            "SELECT id, mentor_id, mentee_id, message, status, status_changed_at, strftime('%s', 'now') "
+            f"FROM match_requests WHERE id IN ({placeholders})",
+            ids,
+        )
+        conn.execute(f"DELETE FROM match_requests WHERE id IN ({placeholders})", ids)
+    return len(ids)
+
+
+def compact(conn, pages=VACUUM_PAGES):
+    # 크기가 크게 바뀐 테이블의 통계 갱신 후 빈 페이지 일부를 반환 (auto_vacuum=INCREMENTAL 인 DB 에서만 줄어듦)
+    conn.execute("ANALYZE match_requests")
+    conn.execute("ANALYZE match_requests_archive")
+    conn.commit()
+    # incremental_vacuum 은 한 번 step 할 때마다 한 페이지씩이라 execute 대신 executescript 로 끝까지 실행
+    conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+
+
+async def run_archive(database, after_days=ARCHIVE_AFTER_DAYS):
+    """배치마다 writer 를 놓아 가며 옮기고, 옮긴 것이 있으면 정리까지 한 뒤 옮긴 수를 반환한다."""
+    cutoff = time.time() - after_days * 86400
+    moved = 0
+    while True:
+        count = await database.write(archive_batch, cutoff)
+        moved += count
+        if count < ARCHIVE_BATCH_SIZE:
+            break
+    if moved:
+        await database.write(compact)
+        logger.info("Archived %d match requests", moved)
+    return moved
+
+
+async def archive_loop(database, interval=ARCHIVE_INTERVAL, after_days=ARCHIVE_AFTER_DAYS):
+    # 워커마다 돌아도 BEGIN IMMEDIATE 안에서 다시 고르므로 같은 요청을 두 번 옮기지 않는다
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_archive(database, after_days)
+        except Exception:
+            logger.exception("Match request archival failed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--vacuum", action="store_true", help="switch to incremental auto_vacuum and VACUUM the whole file")
+    args = parser.parse_args(argv)
+    migrate(args.db)
+    conn = open_connection(args.db)
+    try:
+        cutoff = time.time() - args.older_than_days * 86400
+        moved = 0
+        while True:
+            count = archive_batch(conn, cutoff)
+            moved += count
+            if count < ARCHIVE_BATCH_SIZE:
+                break
+        if args.vacuum:
+            # 쓰기 락을 오래 잡으므로 트래픽이 적을 때 한 번만
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            conn.execute("ANALYZE")
+        else:
+            compact(conn)
+    finally:
+        conn.close()
+    print(f"archived {moved}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,514 @@
+"""백엔드 API 부하/벤치마크 도구
+
+합성 데이터로 DB 를 만들고 로컬 uvicorn 을 띄운 다음, 시나리오별 부하를 걸어서
+엔드포인트별 req/s 와 p50/p95/p99 지연 시간을 JSON 으로 저장한다.
+커밋 간 결과 비교는 compare 명령으로 한다. (httpx 필요)
+
+    python benchmark.py run --output before.json
+    python benchmark.py run --users 10000 --mentors 2000 --requests 50000 --duration 10
+    python benchmark.py compare before.json after.json
+    python benchmark.py serialize --mentors 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import httpx
+import jwt
+from passlib.hash import bcrypt
+from migrations import migrate
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_PASSWORD = "benchpass"
+JWT_SECRET = "benchmark-only-signing-secret-0123456789"
+# 로그인 요청의 EmailStr 검증을 통과하는 도메인 (.local 같은 예약 도메인은 422)
+BENCH_DOMAIN = "example.com"
+
+SKILLS = [
+    "Python", "Java", "JavaScript", "TypeScript", "Go", "Rust", "C", "C++", "C#", "Kotlin",
+    "Swift", "Ruby", "PHP", "Scala", "Elixir", "Haskell", "React", "Vue", "Angular", "Svelte",
+    "Node.js", "Spring", "Django", "FastAPI", "Flask", "Rails", "Laravel", "PostgreSQL", "MySQL",
+    "SQLite", "Redis", "Kafka", "Docker", "Kubernetes", "AWS", "GCP", "Azure", "Terraform",
+    "Linux", "Git",
+]
+
+
+# ---------------------------------------------------------------------------
+# 합성 데이터
+# ---------------------------------------------------------------------------
+
+def seed(workdir, users, mentors, requests, contention_mentors, bcrypt_rounds, rng):
+    """workdir/app.db 를 만들고 (멘토 id 목록, 멘티 id 목록, 경합용 멘토 id 목록) 을 반환한다."""
+    # 앱과 같은 스키마/인덱스
+    migrate(os.path.join(workdir, "app.db"))
+    conn = sqlite3.connect(os.path.join(workdir, "app.db"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    # 모든 계정이 같은 비밀번호 → 해시는 한 번만 계산
+    hashed = bcrypt.using(rounds=bcrypt_rounds).hash(BENCH_PASSWORD)
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (id, email, password, name, role) VALUES (?, ?, ?, ?, ?)",
+            (
+                (i, f"user{i}@{BENCH_DOMAIN}", hashed, f"user{i:07d}", "mentor" if i <= mentors else "mentee")
+                for i in range(1, users + 1)
+            ),
+        )
+        mentor_rows = []
+        skill_rows = []
+        search_rows = []
+        for i in range(1, mentors + 1):
+            skills = rng.sample(SKILLS, rng.randint(1, 5))
+            bio = f"{' / '.join(skills)} 멘토링 경력 {rng.randint(1, 20)}년"
+            mentor_rows.append((i, bio, "", ",".join(skills)))
+            skill_rows.extend((i, s, s.lower(), n) for n, s in enumerate(skills))
+            search_rows.append((i, f"user{i:07d}", bio, " ".join(skills)))
+        conn.executemany("INSERT INTO mentor_profiles (user_id, bio, image_url, skills) VALUES (?, ?, ?, ?)", mentor_rows)
+        conn.executemany("INSERT INTO mentor_skills (user_id, skill, skill_key, position) VALUES (?, ?, ?, ?)", skill_rows)
+        conn.execute("DELETE FROM mentor_search")
+        conn.executemany("INSERT INTO mentor_search (rowid, name, bio, skills) VALUES (?, ?, ?, ?)", search_rows)
+        conn.executemany(
+            "INSERT INTO mentee_profiles (user_id, bio, image_url) VALUES (?, '', '')",
+            ((i,) for i in range(mentors + 1, users + 1)),
+        )
+        mentor_ids = list(range(1, mentors + 1))
+        mentee_ids = list(range(mentors + 1, users + 1))
+        contention = mentor_ids[:contention_mentors]
+        conn.executemany(
+            "INSERT INTO match_requests (mentor_id, mentee_id, message, status) VALUES (?, ?, ?, ?)",
+            _match_request_rows(requests, mentor_ids, mentee_ids, contention, rng),
+        )
+    conn.execute("ANALYZE")
+    conn.close()
+    return mentor_ids, mentee_ids, contention
+
+
+def _match_request_rows(count, mentor_ids, mentee_ids, contention, rng):
+    # 상태 규칙(멘티당 pending 1개, 멘토당 accepted 1개, 쌍당 진행 중 1개)을 지키면서 생성
+    pending_mentees = set()
+    accepted_mentors = set()
+    active_pairs = set()
+    # 경합 시나리오용: 경합 멘토마다 서로 다른 멘티의 pending 요청 20개씩
+    mentee_iter = iter(rng.sample(mentee_ids, min(len(mentee_ids), len(contention) * 20)))
+    made = 0
+    for mentor in contention:
+        for _ in range(20):
+            mentee = next(mentee_iter, None)
+            if mentee is None or made >= count:
+                break
+            pending_mentees.add(mentee)
+            active_pairs.add((mentor, mentee))
+            made += 1
+            yield mentor, mentee, "bench", "pending"
+    while made < count:
+        mentor = rng.choice(mentor_ids)
+        mentee = rng.choice(mentee_ids)
+        status = rng.choices(("rejected", "cancelled", "pending", "accepted"), (50, 40, 7, 3))[0]
+        if status in ("pending", "accepted"):
+            if (mentor, mentee) in active_pairs or mentor in contention:
+                status = "rejected"
+            elif status == "pending" and mentee in pending_mentees:
+                status = "cancelled"
+            elif status == "accepted" and mentor in accepted_mentors:
+                status = "rejected"
+        if status == "pending":
+            pending_mentees.add(mentee)
+            active_pairs.add((mentor, mentee))
+        elif status == "accepted":
+            accepted_mentors.add(mentor)
+            active_pairs.add((mentor, mentee))
+        made += 1
+        yield mentor, mentee, "bench", status
+
+
+# ---------------------------------------------------------------------------
+# 서버
+# ---------------------------------------------------------------------------
+
+# 모든 부하가 127.0.0.1 한 곳에서 오고 같은 계정으로 반복 로그인하므로, 로그인 제한을 풀어서
+# 429 대신 bcrypt 처리량을 잰다
+THROTTLE_ENV = {
+    "LOGIN_IP_BURST": "1000000000",
+    "LOGIN_IP_RATE": "1000000000",
+    "LOGIN_EMAIL_BURST": "1000000000",
+    "LOGIN_EMAIL_RATE": "1000000000",
+}
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, port, workers, bcrypt_rounds):
+    env = dict(os.environ, JWT_SECRET=JWT_SECRET, BCRYPT_ROUNDS=str(bcrypt_rounds),
+               DATABASE_PATH=os.path.join(workdir, "app.db"), **THROTTLE_ENV)
+    env.pop("JWT_KEYS", None)
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app", "--app-dir", BACKEND_DIR,
+            "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+        ],
+        cwd=workdir,
+        env=env,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("uvicorn exited during startup")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/health", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not become healthy in 60s")
+
+
+def make_token(user_id, role):
+    now = int(time.time())
+    payload = {
+        "iss": "mentor-mentee-app", "sub": str(user_id), "user_id": user_id, "aud": "mentor-mentee-client",
+        "exp": now + 3600, "nbf": now, "iat": now, "jti": str(uuid.uuid4()),
+        "name": f"user{user_id:07d}", "email": f"user{user_id}@{BENCH_DOMAIN}", "role": role,
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm="HS256", headers={"kid": "default"})
+
+
+# ---------------------------------------------------------------------------
+# 부하 시나리오
+# ---------------------------------------------------------------------------
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, endpoint, seconds, status):
+        self.samples.setdefault(endpoint, []).append((seconds, status))
+
+
+async def timed(client, recorder, endpoint, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        r = await client.request(method, url, **kwargs)
+        status = r.status_code
+    except httpx.HTTPError:
+        status = 0
+    recorder.add(endpoint, time.perf_counter() - start, status)
+    return status
+
+
+def auth(token):
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def login_storm(client, recorder, ctx, rng):
+    user_id = rng.randint(1, ctx["users"])
+    # 10% 는 틀린 비밀번호 / 없는 계정
+    if rng.random() < 0.1:
+        body = {"email": f"nobody{rng.randint(1, 10**9)}@{BENCH_DOMAIN}", "password": "wrong"}
+    else:
+        body = {"email": f"user{user_id}@{BENCH_DOMAIN}", "password": BENCH_PASSWORD}
+    await timed(client, recorder, "POST /api/login", "POST", "/api/login", json=body)
+
+
+async def mentor_search(client, recorder, ctx, rng):
+    params = {"limit": 20}
+    pick = rng.random()
+    if pick < 0.6:
+        params["skill"] = rng.choice(SKILLS)
+    elif pick < 0.8:
+        params["q"] = rng.choice(SKILLS)
+    if rng.random() < 0.5:
+        params["orderBy"] = rng.choice(("name", "skill"))
+    await timed(client, recorder, "GET /api/mentors", "GET", "/api/mentors", params=params,
+                headers=auth(rng.choice(ctx["mentee_tokens"])))
+
+
+async def read_profile(client, recorder, ctx, rng):
+    token = rng.choice(ctx["mentee_tokens"] + ctx["mentor_tokens"])
+    await timed(client, recorder, "GET /api/me", "GET", "/api/me", headers=auth(token))
+
+
+async def list_requests(client, recorder, ctx, rng):
+    if rng.random() < 0.5:
+        await timed(client, recorder, "GET /api/match-requests/incoming", "GET", "/api/match-requests/incoming",
+                    params={"limit": 20}, headers=auth(rng.choice(ctx["mentor_tokens"])))
+    else:
+        await timed(client, recorder, "GET /api/match-requests/outgoing", "GET", "/api/match-requests/outgoing",
+                    params={"limit": 20}, headers=auth(rng.choice(ctx["mentee_tokens"])))
+
+
+async def accept_reject_contention(client, recorder, ctx, rng):
+    # 같은 멘토의 pending 요청들을 여러 클라이언트가 동시에 수락/거절
+    mentor_id, request_ids = rng.choice(ctx["contention"])
+    request_id = rng.choice(request_ids)
+    action = "accept" if rng.random() < 0.5 else "reject"
+    await timed(client, recorder, f"PUT /api/match-requests/{{id}}/{action}", "PUT",
+                f"/api/match-requests/{request_id}/{action}", headers=auth(ctx["contention_tokens"][mentor_id]))
+
+
+SCENARIOS = {
+    "login": [(login_storm, 1)],
+    "search": [(mentor_search, 1)],
+    "contention": [(accept_reject_contention, 1)],
+    "mixed": [(mentor_search, 45), (read_profile, 25), (list_requests, 20), (login_storm, 5), (accept_reject_contention, 5)],
+}
+
+# 시나리오가 일부러 만드는 2xx 외 응답 (틀린 비밀번호, 이미 처리된 요청). 나머지 4xx 는 unexpected 로 집계
+EXPECTED_STATUSES = {
+    "POST /api/login": {401},
+    "PUT /api/match-requests/{id}/accept": {400},
+    "PUT /api/match-requests/{id}/reject": {400},
+}
+
+
+async def drive(base_url, scenario, ctx, concurrency, duration, seed_value):
+    recorder = Recorder()
+    steps, weights = zip(*SCENARIOS[scenario])
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def worker(n):
+        rng = random.Random(seed_value * 1000 + n)
+        async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+            while time.perf_counter() < deadline:
+                step = rng.choices(steps, weights)[0]
+                await step(client, recorder, ctx, rng)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    return recorder, time.perf_counter() - start
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    result = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = sorted(s for s, _ in samples)
+        statuses = {}
+        for _, status in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        result[endpoint] = {
+            "requests": len(samples),
+            "rps": round(len(samples) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+            "errors": sum(n for code, n in statuses.items() if code == "0" or code.startswith("5")),
+            "unexpected": sum(
+                n for code, n in statuses.items()
+                if code.startswith("4") and int(code) not in EXPECTED_STATUSES.get(endpoint, ())
+            ),
+            "ok": sum(n for code, n in statuses.items() if code.startswith("2")),
+            "status": statuses,
+        }
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cmd_run(args):
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="mentor-bench-")
+    proc = None
+    try:
+        t0 = time.time()
+        mentor_ids, mentee_ids, contention = seed(
+            workdir, args.users, args.mentors, args.requests, args.contention_mentors, args.bcrypt_rounds, rng
+        )
+        seed_seconds = time.time() - t0
+        print(f"seeded {args.users} users / {args.mentors} mentors / {args.requests} requests in {seed_seconds:.1f}s")
+        conn = sqlite3.connect(os.path.join(workdir, "app.db"))
+        contention_requests = [
+            (mentor, [r[0] for r in conn.execute(
+                "SELECT id FROM match_requests WHERE mentor_id=? AND status='pending'", (mentor,))])
+            for mentor in contention
+        ]
+        conn.close()
+        ctx = {
+            "users": args.users,
+            "mentee_tokens": [make_token(i, "mentee") for i in rng.sample(mentee_ids, min(200, len(mentee_ids)))],
+            "mentor_tokens": [make_token(i, "mentor") for i in rng.sample(mentor_ids, min(200, len(mentor_ids)))],
+            "contention": [c for c in contention_requests if c[1]],
+            "contention_tokens": {m: make_token(m, "mentor") for m in contention},
+        }
+        port = free_port()
+        proc = start_server(workdir, port, args.workers, args.bcrypt_rounds)
+        results = {}
+        failed = []
+        for scenario in args.scenarios:
+            if scenario == "contention" and not ctx["contention"]:
+                continue
+            recorder, elapsed = asyncio.run(
+                drive(f"http://127.0.0.1:{port}", scenario, ctx, args.concurrency, args.duration, args.seed)
+            )
+            results[scenario] = summarize(recorder, elapsed)
+            total = sum(e["requests"] for e in results[scenario].values())
+            print(f"{scenario:>10}: {total / elapsed:8.1f} req/s")
+            for endpoint, stats in results[scenario].items():
+                print(f"    {endpoint:<42} {stats['rps']:8.1f}/s  p50 {stats['p50_ms']:7.1f}ms  "
+                      f"p95 {stats['p95_ms']:7.1f}ms  p99 {stats['p99_ms']:7.1f}ms  errors {stats['errors']}  "
+                      f"unexpected {stats['unexpected']}")
+                # 2xx 없이 실패만 잰 엔드포인트 (경합 시나리오에서 요청이 모두 처리되어 400 만 남는 것은 제외)
+                if not stats["ok"] and (stats["unexpected"] or stats["errors"]):
+                    failed.append(f"{scenario} {endpoint} {stats['status']}")
+        report = {
+            "commit": git_commit(),
+            "timestamp": int(time.time()),
+            "params": {k: v for k, v in vars(args).items() if k != "func"},
+            "seed_seconds": round(seed_seconds, 2),
+            "scenarios": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"wrote {args.output}")
+        for line in failed:
+            print(f"no 2xx responses: {line}", file=sys.stderr)
+        return 1 if failed else 0
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if not args.keep_db:
+            shutil.rmtree(workdir, ignore_errors=True)
+        else:
+            print(f"database kept in {workdir}")
+
+
+def cmd_compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    for scenario, endpoints in after["scenarios"].items():
+        print(scenario)
+        for endpoint, new in endpoints.items():
+            old = before["scenarios"].get(scenario, {}).get(endpoint)
+            if not old:
+                print(f"    {endpoint:<42} (new)")
+                continue
+            cells = []
+            for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+                change = (new[metric] - old[metric]) / old[metric] * 100 if old[metric] else 0.0
+                cells.append(f"{metric} {old[metric]:.1f}->{new[metric]:.1f} ({change:+.0f}%)")
+            print(f"    {endpoint:<42} " + "  ".join(cells))
+
+
+# ---------------------------------------------------------------------------
+# 목록 응답 직렬화 비용
+# ---------------------------------------------------------------------------
+
+def legacy_mentor_dicts(conn):
+    # SQL JSON 경로 이전 방식: 행 → dict 목록 (이후 인코더가 직렬화)
+    rows = conn.execute(
+        "SELECT u.id, u.email, u.role, u.name, p.bio, p.image_url, p.skills "
+        "FROM users u JOIN mentor_profiles p ON u.id = p.user_id WHERE u.role = 'mentor' ORDER BY u.id"
+    ).fetchall()
+    mentors = []
+    for row in rows:
+        profile = {"name": row[3], "bio": row[4], "imageUrl": row[5], "skills": row[6].split(",") if row[6] else []}
+        mentors.append({"id": row[0], "email": row[1], "role": row[2], "profile": profile})
+    return mentors
+
+
+def cmd_serialize(args):
+    """멘토 N 명 전체 목록을 만드는 데 걸리는 시간 (조회 + 직렬화) 을 방식별로 잰다."""
+    from fastapi.encoders import jsonable_encoder
+    from db import open_connection
+    from main import build_mentor_page, MENTOR_PROFILE_COLUMNS
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="mentor-serialize-")
+    try:
+        seed(workdir, args.mentors + 1, args.mentors, 0, 0, 4, rng)
+        conn = open_connection(os.path.join(workdir, "app.db"))
+        selected = list(MENTOR_PROFILE_COLUMNS)
+        variants = {
+            # FastAPI 가 list 반환값을 처리하는 기본 경로
+            "dicts + jsonable_encoder + json.dumps": lambda: json.dumps(
+                jsonable_encoder(legacy_mentor_dicts(conn)), ensure_ascii=False, separators=(",", ":")
+            ).encode(),
+            "dicts + json.dumps": lambda: json.dumps(
+                legacy_mentor_dicts(conn), ensure_ascii=False, separators=(",", ":")
+            ).encode(),
+            "sqlite json_object": lambda: build_mentor_page(conn, None, None, None, None, None, selected)[0],
+        }
+        bodies = {name: fn() for name, fn in variants.items()}
+        assert len({json.dumps(json.loads(b), sort_keys=True) for b in bodies.values()}) == 1, "outputs differ"
+        results = {}
+        for name, fn in variants.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                fn()
+                timings.append(time.perf_counter() - start)
+            per_1k = sorted(timings)[len(timings) // 2] * 1000 / args.mentors * 1000
+            results[name] = round(per_1k, 3)
+            print(f"{name:<40} {per_1k:8.2f} ms per 1k mentors")
+        conn.close()
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump({"commit": git_commit(), "mentors": args.mentors, "ms_per_1k_mentors": results}, f, indent=2)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(required=True)
+    run = sub.add_parser("run", help="seed a database, start uvicorn and run the scenarios")
+    run.add_argument("--users", type=int, default=100_000)
+    run.add_argument("--mentors", type=int, default=20_000)
+    run.add_argument("--requests", type=int, default=500_000)
+    run.add_argument("--contention-mentors", type=int, default=20)
+    run.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    run.add_argument("--duration", type=float, default=20.0, help="seconds per scenario")
+    run.add_argument("--concurrency", type=int, default=32)
+    run.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    run.add_argument("--bcrypt-rounds", type=int, default=12)
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--output", default="benchmark-results.json")
+    run.add_argument("--keep-db", action="store_true")
+    run.set_defaults(func=cmd_run)
+    compare = sub.add_parser("compare", help="diff two result files")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    compare.set_defaults(func=cmd_compare)
+    serialize = sub.add_parser("serialize", help="time mentor list serialization strategies")
+    serialize.add_argument("--mentors", type=int, default=1000)
+    serialize.add_argument("--repeat", type=int, default=20)
+    serialize.add_argument("--seed", type=int, default=1)
+    serialize.add_argument("--output")
+    serialize.set_defaults(func=cmd_serialize)
+    args = parser.parse_args(argv)
+    if args.func is cmd_run and args.mentors >= args.users:
+        parser.error("--mentors must be smaller than --users")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+"""사용자 일괄 가입 / 사용자·매칭 요청 내보내기
+
+    python bulk.py import cohort.csv --errors errors.jsonl
+    python bulk.py import cohort.jsonl --workers 8
+    python bulk.py export users -o users.jsonl
+    python bulk.py export match-requests --format csv -o requests.csv
+
+가져오기 컬럼: email, name, role(mentor/mentee), password 또는 password_hash, bio, skills
+(CSV 의 skills 는 "Python,Java" 처럼 콤마 구분, JSONL 은 문자열 또는 배열).
+비밀번호 해시는 여러 프로세스에서 병렬로 계산하고, 다음 배치의 해시 계산과
+현재 배치의 INSERT(executemany, 배치당 트랜잭션 하나) 가 겹쳐서 진행된다.
+
+실행 중인 서버에는 RESPONSE_CACHE_BACKEND=shared 일 때만 멘토 목록이 바로 반영된다.
+memory 캐시는 RESPONSE_CACHE_TTL, 추천 색인은 RECOMMEND_INDEX_TTL 이 지난 뒤에 보인다.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from email_validator import validate_email, EmailNotValidError
+from passlib.hash import bcrypt
+from cache import CACHE_BACKEND, ResponseCache, SharedSQLiteBackend
+from db import DB_PATH, open_connection, immediate_transaction, shared_file_path
+from migrations import migrate
+from passwords import BCRYPT_ROUNDS
+from search import normalize_skills
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+EXPORT_FETCH_SIZE = 1000
+ROLES = ("mentor", "mentee")
+
+
+def hash_password(password, rounds):
+    # 프로세스 풀에서 실행 (pickle 가능한 최상위 함수)
+    return bcrypt.using(rounds=rounds).hash(password)
+
+
+def read_rows(stream, fmt):
+    """(줄 번호, dict) 를 하나씩 읽는다. 파싱할 수 없는 줄은 dict 대신 에러 메시지."""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_num, f"Invalid JSON: {e}"
+            continue
+        yield line_num, row if isinstance(row, dict) else "Expected a JSON object"
+
+
+def clean_row(row):
+    """입력 한 줄을 검증해서 (email, name, role, password, password_hash, bio, skills) 로 만든다."""
+    if isinstance(row, str):
+        raise ValueError(row)
+    role = (row.get("role") or "").strip()
+    if role not in ROLES:
+        raise ValueError(f"role must be one of {', '.join(ROLES)}")
+    name = (row.get("name") or "").strip()
+    if not name:
+        raise ValueError("name is required")
+    try:
+        email = validate_email((row.get("email") or "").strip(), check_deliverability=False).normalized
+    except EmailNotValidError as e:
+        raise ValueError(f"Invalid email: {e}")
+    password = row.get("password") or ""
+    password_hash = row.get("password_hash") or ""
+    if password_hash and not bcrypt.identify(password_hash):
+        raise ValueError("password_hash is not a bcrypt hash")
+    if not password and not password_hash:
+        raise ValueError("password or password_hash is required")
+    skills = row.get("skills") or []
+    if isinstance(skills, str):
+        skills = skills.split(",")
+    skills = normalize_skills(skills) if role == "mentor" else []
+    return email, name, role, password, password_hash, row.get("bio") or "", skills
+
+
+def batches(rows, size):
+    batch = []
+    for item in rows:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_batch(conn, batch, hashes, report):
+    """검증된 한 배치를 하나의 트랜잭션으로 넣고 넣은 행 수를 반환한다."""
+    by_email = {}
+    for (line_num, row), hashed in zip(batch, hashes):
+        if isinstance(hashed, Exception):
+            report(line_num, row[0], f"Password hash failed: {hashed}")
+        elif row[0] in by_email:
+            report(line_num, row[0], "Duplicate email in input")
+        else:
+            by_email[row[0]] = (line_num, row, hashed)
+    if not by_email:
+        return 0
+    placeholders = ", ".join("?" for _ in by_email)
+    with immediate_transaction(conn):
+        existing = {
+            r[0] for r in conn.execute(f"SELECT email FROM users WHERE email IN ({placeholders})", list(by_email))
+        }
+        for email in sorted(existing, key=lambda e: by_email[e][0]):
+            line_num, _, _ = by_email.pop(email)
+            report(line_num, email, "Email already exists")
+        if not by_email:
+            return 0
+        conn.executemany(
+            "INSERT INTO users (email, password, name, role) VALUES (?, ?, ?, ?)",
+            [(email, hashed, row[1], row[2]) for email, (_, row, hashed) in by_email.items()],
+        )
+        placeholders = ", ".join("?" for _ in by_email)
+        ids = dict(conn.execute(f"SELECT email, id FROM users WHERE email IN ({placeholders})", list(by_email)))
+        mentors = [(ids[email], row) for email, (_, row, _) in by_email.items() if row[2] == "mentor"]
+        mentees = [(ids[email], row) for email, (_, row, _) in by_email.items() if row[2] == "mentee"]
+        conn.executemany(
+            "INSERT INTO mentor_profiles (user_id, bio, image_url, skills) VALUES (?, ?, '', ?)",
+            [(user_id, row[5], ",".join(row[6])) for user_id, row in mentors],
+        )
+        conn.executemany(
+            "INSERT INTO mentee_profiles (user_id, bio, image_url) VALUES (?, ?, '')",
+            [(user_id, row[5]) for user_id, row in mentees],
+        )
+        # search.sync_mentor_index 와 같은 내용을 배치로
+        conn.executemany(
+            "INSERT INTO mentor_skills (user_id, skill, skill_key, position) VALUES (?, ?, ?, ?)",
+            [(user_id, s, s.lower(), i) for user_id, row in mentors for i, s in enumerate(row[6])],
+        )
+        conn.executemany(
+            "INSERT INTO mentor_search (rowid, name, bio, skills) VALUES (?, ?, ?, ?)",
+            [(user_id, row[1], row[5], " ".join(row[6])) for user_id, row in mentors],
+        )
+    return len(by_email)
+
+
+def import_users(stream, fmt, conn, report, rounds=BCRYPT_ROUNDS, workers=None, batch_size=BATCH_SIZE):
+    """stream 의 사용자들을 가입시키고 넣은 수를 반환한다. 실패한 줄은 report(줄, email, 이유)."""
+
+    def valid_rows():
+        for line_num, row in read_rows(stream, fmt):
+            try:
+                yield line_num, clean_row(row)
+            except ValueError as e:
+                email = row.get("email") if isinstance(row, dict) else None
+                report(line_num, email, str(e))
+
+    def submit(executor, batch):
+        return [
+            executor.submit(hash_password, row[3], rounds) if not row[4] else row[4]
+            for _, row in batch
+        ]
+
+    def results(futures):
+        hashes = []
+        for f in futures:
+            if isinstance(f, str):
+                hashes.append(f)
+                continue
+            try:
+                hashes.append(f.result())
+            except Exception as e:
+                hashes.append(e)
+        return hashes
+
+    imported = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = None
+        for batch in batches(valid_rows(), batch_size):
+            # 이 배치의 해시를 먼저 맡겨 두고 이전 배치를 INSERT
+            futures = submit(executor, batch)
+            if pending:
+                imported += insert_batch(conn, pending[0], results(pending[1]), report)
+            pending = (batch, futures)
+        if pending:
+            imported += insert_batch(conn, pending[0], results(pending[1]), report)
+    return imported
+
+
+def invalidate_server_cache(db_path):
+    """공유 캐시를 쓰는 서버들의 멘토 목록 캐시를 무효화한다. memory 캐시면 다른 프로세스라 할 수 없어서 False."""
+    if CACHE_BACKEND != "shared":
+        return False
+    path = os.environ.get("RESPONSE_CACHE_PATH") or shared_file_path("cache", db_path)
+    ResponseCache("mentors", SharedSQLiteBackend(path)).invalidate()
+    return True
+
+
+EXPORTS = {
+    "users": (
+        ["id", "email", "name", "role", "bio", "skills", "image_url"],
+        """
+        SELECT u.id, u.email, u.name, u.role,
+               COALESCE(mp.bio, ep.bio, ''), COALESCE(mp.skills, ''), COALESCE(mp.image_url, ep.image_url, '')
+        FROM users u
+        LEFT JOIN mentor_profiles mp ON u.role = 'mentor' AND mp.user_id = u.id
+        LEFT JOIN mentee_profiles ep ON u.role = 'mentee' AND ep.user_id = u.id
+        ORDER BY u.id
+        """,
+    ),
+    "match-requests": (
+        ["id", "mentor_id", "mentee_id", "message", "status"],
+        "SELECT id, mentor_id, mentee_id, message, status FROM match_requests_all ORDER BY id",
+    ),
+}
+
+
+def export_rows(conn, kind, out, fmt, include_password_hash=False):
+    """kind 의 행을 EXPORT_FETCH_SIZE 개씩 읽어서 바로 out 에 쓴다 (전체를 메모리에 올리지 않음)."""
+    columns, query = EXPORTS[kind]
+    if kind == "users" and include_password_hash:
+        columns = columns + ["password_hash"]
+        query = query.replace("FROM users u", ", u.password FROM users u", 1)
+    writer = csv.writer(out) if fmt == "csv" else None
+    if writer:
+        writer.writerow(columns)
+    count = 0
+    cursor = conn.execute(query)
+    while True:
+        rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+        if not rows:
+            break
+        for row in rows:
+            if writer:
+                writer.writerow(row)
+            else:
+                item = dict(zip(columns, row))
+                if "skills" in item:
+                    item["skills"] = item["skills"].split(",") if item["skills"] else []
+                out.write(json.dumps(item, ensure_ascii=False) + "\n")
+        count += len(rows)
+    return count
+
+
+def detect_format(path, fmt):
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+
+def cmd_import(args):
+    migrate(args.db)
+    conn = open_connection(args.db)
+    errors_out = open(args.errors, "w") if args.errors else sys.stderr
+    failed = 0
+
+    def report(line_num, email, reason):
+        nonlocal failed
+        failed += 1
+        errors_out.write(json.dumps({"line": line_num, "email": email, "error": reason}, ensure_ascii=False) + "\n")
+
+    try:
+        stream = sys.stdin if args.source == "-" else open(args.source, newline="", encoding="utf-8")
+        with stream:
+            imported = import_users(
+                stream, detect_format(args.source, args.format), conn, report,
+                rounds=args.rounds, workers=args.workers, batch_size=args.batch_size,
+            )
+    finally:
+        conn.close()
+        if args.errors:
+            errors_out.close()
+    print(f"imported {imported}, failed {failed}", file=sys.stderr)
+    if imported and not invalidate_server_cache(args.db):
+        print("running servers show new mentors after RESPONSE_CACHE_TTL / RECOMMEND_INDEX_TTL", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def cmd_export(args):
+    conn = open_connection(args.db)
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        count = export_rows(conn, args.kind, out, detect_format(args.output, args.format), args.include_password_hash)
+    finally:
+        conn.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f"exported {count} {args.kind}", file=sys.stderr)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default=DB_PATH)
+    sub = parser.add_subparsers(required=True)
+    imp = sub.add_parser(
+        "import",
+        help="bulk sign up users from CSV/JSONL",
+        description="Bulk sign up users. Running servers see new mentors at once only with "
+                    "RESPONSE_CACHE_BACKEND=shared; otherwise after RESPONSE_CACHE_TTL and RECOMMEND_INDEX_TTL.",
+    )
+    imp.add_argument("source", help="input file, or - for stdin")
+    imp.add_argument("--format", choices=["csv", "jsonl"])
+    imp.add_argument("--errors", help="write per-row errors (JSONL) here instead of stderr")
+    imp.add_argument("--workers", type=int, default=os.cpu_count(), help="password hashing processes")
+    imp.add_argument("--rounds", type=int, default=BCRYPT_ROUNDS)
+    imp.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    imp.set_defaults(func=cmd_import)
+    exp = sub.add_parser("export", help="stream users or match requests as CSV/JSONL")
+    exp.add_argument("kind", choices=list(EXPORTS))
+    exp.add_argument("-o", "--output", default="-")
+    exp.add_argument("--format", choices=["csv", "jsonl"])
+    exp.add_argument("--include-password-hash", action="store_true", help="users only; re-importable as password_hash")
+    exp.set_defaults(func=cmd_export)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
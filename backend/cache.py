@@ -0,0 +1,157 @@
+# 응답 캐시 (직렬화된 JSON 바이트 저장, 버전 증가로 무효화)
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from db import shared_file_path
+
+# memory: 프로세스 내 LRU (워커 1개일 때), shared: 워커들이 같이 쓰는 SQLite 파일
+CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "512"))
+# 버전 증가를 놓쳐도 이 시간이 지나면 다시 계산
+CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "300"))
+SHARED_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH") or shared_file_path("cache")
+
+
+class LRUBackend:
+    # 락만 잡고 끝나므로 이벤트 루프에서 바로 호출해도 된다
+    in_process = True
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0], entry[1]
+
+    def set(self, key, body, headers):
+        with self._lock:
+            self._entries[key] = (body, headers, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def version(self, name):
+        return self._versions.get(name, 0)
+
+    def bump(self, name):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+
+
+class SharedSQLiteBackend:
+    """여러 uvicorn 워커가 공유하는 캐시. 기본 위치는 /dev/shm (메모리 파일시스템).
+
+    버전도 같은 파일에 있어서 한 워커의 무효화가 모든 워커에 바로 반영된다.
+    다른 워커의 쓰기 락을 기다릴 수 있으므로 (최대 timeout) 이벤트 루프에서는 스레드풀로 호출한다.
+    """
+
+    in_process = False
+
+    def __init__(self, path=SHARED_CACHE_PATH, maxsize=CACHE_SIZE, ttl=CACHE_TTL):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, body BLOB, headers TEXT, expires_at REAL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS versions (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT body, headers FROM entries WHERE key=? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def set(self, key, body, headers):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, body, headers, expires_at) VALUES (?, ?, ?, ?)",
+            (key, body, json.dumps(headers), time.time() + self.ttl),
+        )
+        self._writes += 1
+        if self._writes % 64 == 0:
+            # 만료된 항목과 오래된 항목 정리
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM entries WHERE key NOT IN (SELECT key FROM entries ORDER BY expires_at DESC LIMIT ?)",
+                (self.maxsize,),
+            )
+
+    def version(self, name):
+        row = self._conn().execute("SELECT version FROM versions WHERE name=?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, name):
+        self._conn().execute(
+            "INSERT INTO versions (name, version) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+            (name,),
+        )
+
+
+def make_backend(kind=CACHE_BACKEND):
+    if kind == "shared":
+        return SharedSQLiteBackend()
+    if kind == "memory":
+        return LRUBackend()
+    raise RuntimeError(f"Unknown RESPONSE_CACHE_BACKEND {kind!r}")
+
+
+class ResponseCache:
+    """이름 단위로 버전이 관리되는 응답 캐시.
+
+    키에 현재 버전이 들어가므로 invalidate() 후에는 이전 항목이 다시 쓰이지 않는다.
+    """
+
+    def __init__(self, name, backend):
+        self.name = name
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, **params):
+        version = self.backend.version(self.name)
+        return f"{self.name}:{version}:" + json.dumps(params, sort_keys=True, ensure_ascii=False)
+
+    def get(self, key):
+        found = self.backend.get(key)
+        if found is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return found
+
+    def set(self, key, body, headers):
+        self.backend.set(key, body, headers)
+
+    def invalidate(self):
+        self.backend.bump(self.name)
+
+
+# 멘토 목록: 멘토 가입/프로필 수정 시 무효화
+mentor_cache = ResponseCache("mentors", make_backend())
@@ -0,0 +1,97 @@
+# 테스트 공통 설정과 팩토리 픽스처
+#
+# 앱 모듈은 import 할 때 환경 변수를 읽으므로 import 전에 설정한다.
+# xdist 워커(pytest -n auto)마다 임시 디렉터리를 따로 쓰고, 테스트마다 빈 DB 에서 시작한다.
+import os
+import shutil
+import tempfile
+import uuid
+from types import SimpleNamespace
+
+WORK_DIR = tempfile.mkdtemp(prefix=f"mentor-test-{os.environ.get('PYTEST_XDIST_WORKER', 'main')}-")
+os.environ.setdefault("DATABASE_PATH", os.path.join(WORK_DIR, "app.db"))
+os.environ.setdefault("STATIC_DIR", os.path.join(WORK_DIR, "static"))
+# bcrypt 최소 비용 (기본 12 는 해시 한 번에 수백 ms)
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("MATCH_ARCHIVE_INTERVAL", "0")
+# 모든 요청이 같은 클라이언트 IP(testclient) 에서 온다
+os.environ.setdefault("LOGIN_IP_BURST", "100000")
+
+import pytest
+from fastapi.testclient import TestClient
+from cache import mentor_cache
+from db import use_database
+from images import image_meta
+from main import app
+from migrations import migrate
+from recommend import mentor_index
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client():
+    # lifespan (마이그레이션, 폐기 목록 로드) 은 세션에서 한 번
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """테스트마다 새 임시 DB 를 앱에 주입하고, 이전 DB 내용을 들고 있는 메모리 캐시를 비운다."""
+    path = str(tmp_path / "app.db")
+    migrate(path)
+    use_database(path)
+    mentor_cache.invalidate()
+    mentor_index.built_at = None
+    image_meta.clear()
+    return path
+
+
+@pytest.fixture
+def make_user(client):
+    """가입 + 로그인한 사용자 (id, email, password, name, role, headers). 프로필 인자를 주면 수정까지."""
+
+    def make(role, name=None, password="pass", bio=None, skills=None):
+        tag = uuid.uuid4().hex[:8]
+        email = f"{role}-{tag}@example.com"
+        name = name or f"{role}{tag}"
+        r = client.post("/api/signup", json={"email": email, "password": password, "name": name, "role": role})
+        assert r.status_code == 201, r.text
+        token = client.post("/api/login", json={"email": email, "password": password}).json()["token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        user_id = client.get("/api/me", headers=headers).json()["id"]
+        if bio is not None or skills is not None:
+            profile = {"id": user_id, "name": name, "role": role, "bio": bio or "", "image": "", "skills": skills}
+            assert client.put("/api/profile", json=profile, headers=headers).status_code == 200
+        return SimpleNamespace(id=user_id, email=email, password=password, name=name, role=role, headers=headers)
+
+    return make
+
+
+@pytest.fixture
+def make_mentor(make_user):
+    return lambda **kwargs: make_user("mentor", **kwargs)
+
+
+@pytest.fixture
+def make_mentee(make_user):
+    return lambda **kwargs: make_user("mentee", **kwargs)
+
+
+@pytest.fixture
+def make_request(client):
+    """mentee 가 mentor 에게 보낸 매칭 요청 id."""
+
+    def make(mentee, mentor, message="멘토링 요청합니다"):
+        r = client.post(
+            "/api/match-requests",
+            json={"mentorId": mentor.id, "menteeId": mentee.id, "message": message},
+            headers=mentee.headers,
+        )
+        assert r.status_code == 200, r.text
+        return r.json()["id"]
+
+    return make
@@ -0,0 +1,279 @@
+# SQLite 커넥션 풀
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from metrics import ProfiledConnection
+
+# 기본값은 실행 디렉터리의 app.db
+DB_PATH = os.environ.get("DATABASE_PATH", "app.db")
+# 워커들이 같이 쓰는 부가 파일(응답 캐시, 로그인 제한) 위치. 기본은 메모리 파일시스템
+SHARED_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else os.path.dirname(os.path.abspath(__file__))
+
+
+def shared_file_path(kind, db_path=None):
+    # DB 경로마다 다른 파일 → 같은 호스트의 다른 인스턴스(스테이징/운영, 병렬 테스트)와 섞이지 않는다
+    digest = hashlib.sha256(os.path.abspath(db_path or DB_PATH).encode()).hexdigest()[:12]
+    return os.path.join(SHARED_DIR, f"mentor-mentee-{kind}-{digest}.db")
+
+
+# SQL 문별 실행 시간/행 수 기록 (0 이면 기본 sqlite3.Connection 사용)
+PROFILE_SQL = os.environ.get("PROFILE_SQL", "1") != "0"
+
+POOL_SIZE = 8
+ACQUIRE_TIMEOUT = 5.0
+
+# 커넥션 생성 시 적용하는 PRAGMA (WAL 모드 + 읽기 성능 튜닝)
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-16000",     # 약 16MB 페이지 캐시
+    "PRAGMA mmap_size=268435456",   # 256MB mmap
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+def open_connection(path, timeout=ACQUIRE_TIMEOUT):
+    conn = sqlite3.connect(
+        path,
+        timeout=timeout,
+        check_same_thread=False,
+        cached_statements=256,  # prepared statement 재사용
+        factory=ProfiledConnection if PROFILE_SQL else sqlite3.Connection,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def open_snapshot_connection(path):
+    # 읽기 전용 스냅샷 (replica.py). 바뀌지 않는 파일이라 immutable 로 열어서 잠금/WAL 확인을 건너뛴다
+    conn = sqlite3.connect(
+        f"file:{path}?mode=ro&immutable=1",
+        uri=True,
+        check_same_thread=False,
+        cached_statements=256,
+        factory=ProfiledConnection if PROFILE_SQL else sqlite3.Connection,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in ("PRAGMA cache_size=-16000", "PRAGMA mmap_size=268435456", "PRAGMA temp_store=MEMORY"):
+        conn.execute(pragma)
+    return conn
+
+
+class ConnectionPool:
+    """고정 크기 sqlite3 커넥션 풀.
+
+    커넥션은 스레드 간에 공유되지 않고 한 번에 한 요청만 사용한다.
+    반납 시 열린 트랜잭션은 롤백해서 다음 사용자가 깨끗한 상태로 받는다.
+    """
+
+    def __init__(self, path, size=POOL_SIZE, timeout=ACQUIRE_TIMEOUT):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self):
+        return open_connection(self.path, self.timeout)
+
+    def acquire(self):
+        if self._closed:
+            raise PoolExhausted("Connection pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolExhausted("Timed out waiting for a database connection")
+
+    def release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+            return
+        self._idle.put_nowait(conn)
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        # (생성된 커넥션 수, 대기 중인 커넥션 수)
+        return self._created, self._idle.qsize()
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+
+    def reset(self, path):
+        # 대기 중인 커넥션을 닫고 이후에는 path 로 연다 (빌려 간 커넥션이 없을 때만)
+        self.close()
+        self.path = path
+        self._closed = False
+
+
+pool = ConnectionPool(DB_PATH)
+
+
+@contextmanager
+def connection():
+    # 풀에서 커넥션을 빌려 쓰고 예외 여부와 상관없이 반납
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def immediate_transaction(conn):
+    """BEGIN IMMEDIATE 트랜잭션. 시작 시점에 쓰기 락을 잡아서
+    검사 → 변경 사이에 다른 워커가 끼어들 수 없다. 예외가 나면 롤백."""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+def get_db():
+    # FastAPI 의존성: 요청이 끝나면 풀에 반납
+    with connection() as conn:
+        yield conn
+
+
+class AsyncDatabase:
+    """이벤트 루프에서 await 하는 DB 접근 계층.
+
+    읽기는 리더 스레드들(스레드마다 전용 커넥션)에서, 쓰기는 전용 writer 스레드 하나에서
+    순서대로 실행한다. Starlette 기본 스레드풀을 쓰지 않으므로 느린 클라이언트가 많아도
+    대기 중인 요청은 스레드를 잡지 않고, DB 작업 수만큼만 스레드를 쓴다.
+    프로세스 내 쓰기는 writer 에서 직렬화되고, 다른 워커와의 경합은 BEGIN IMMEDIATE 로 처리한다.
+    """
+
+    def __init__(self, path=DB_PATH, readers=POOL_SIZE):
+        self.path = path
+        self.readers = readers
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._reader_pool = None
+        self._writer_pool = None
+
+    def _executors(self):
+        with self._lock:
+            if self._reader_pool is None:
+                self._reader_pool = ThreadPoolExecutor(self.readers, thread_name_prefix="db-reader")
+                self._writer_pool = ThreadPoolExecutor(1, thread_name_prefix="db-writer")
+            return self._reader_pool, self._writer_pool
+
+    def _snapshot_connection(self, snapshot):
+        # 리더 스레드마다 최신 스냅샷 하나만 열어 둔다 (스냅샷이 바뀌면 이전 것은 닫음)
+        current = getattr(self._local, "snapshot", None)
+        if current and current[0] == snapshot.path:
+            return current[1]
+        conn = open_snapshot_connection(snapshot.path)
+        with self._lock:
+            if current:
+                self._connections.remove(current[1])
+            self._connections.append(conn)
+        if current:
+            current[1].close()
+        self._local.snapshot = (snapshot.path, conn)
+        return conn
+
+    def _call_snapshot(self, snapshot, fn, args):
+        try:
+            conn = self._snapshot_connection(snapshot)
+        except sqlite3.OperationalError:
+            # 대기하는 사이 교체되어 지워진 스냅샷 → app.db 에서 읽는다
+            return self._call(fn, args)
+        return fn(conn, *args)
+
+    def _call(self, fn, args):
+        # 스레드별 커넥션은 첫 작업 때 연다 (마이그레이션 이후)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = open_connection(self.path)
+            with self._lock:
+                self._connections.append(conn)
+        try:
+            return fn(conn, *args)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+
+    async def read(self, fn, *args, snapshot=None):
+        """fn(conn, *args) 를 리더 스레드에서 실행한다. snapshot 을 주면 app.db 대신 그 스냅샷에서 읽는다."""
+        readers, _ = self._executors()
+        if snapshot is not None:
+            return await asyncio.get_running_loop().run_in_executor(readers, self._call_snapshot, snapshot, fn, args)
+        return await asyncio.get_running_loop().run_in_executor(readers, self._call, fn, args)
+
+    async def write(self, fn, *args):
+        """fn(conn, *args) 를 writer 스레드에서 실행한다. 커밋은 fn 이 한다."""
+        _, writer = self._executors()
+        return await asyncio.get_running_loop().run_in_executor(writer, self._call, fn, args)
+
+    def close(self):
+        with self._lock:
+            executors = (self._reader_pool, self._writer_pool)
+            self._reader_pool = self._writer_pool = None
+            connections, self._connections = self._connections, []
+        for executor in executors:
+            if executor:
+                executor.shutdown(wait=True)
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+
+database = AsyncDatabase()
+
+
+def use_database(path):
+    """앱이 쓰는 DB(pool, database) 를 path 로 바꾼다. 테스트에서 임시 DB 를 주입할 때 사용."""
+    pool.reset(path)
+    database.close()
+    database.path = path
@@ -0,0 +1,185 @@
+# 매칭 요청 상태 변경 이벤트 (SSE)
+import asyncio
+import json
+import threading
+from fastapi.concurrency import run_in_threadpool
+from db import connection
+
+# 다른 워커 프로세스에서 기록된 이벤트 확인 주기
+POLL_INTERVAL = 2.0
+KEEPALIVE_INTERVAL = 15.0
+RETRY_MS = 3000
+BATCH_SIZE = 100
+
+EVENT_STATUS = {
+    "created": "pending",
+    "accepted": "accepted",
+    "rejected": "rejected",
+    "cancelled": "cancelled",
+}
+
+
+def record_match_event(c, event_type, request_id, mentor_id, mentee_id):
+    # 상태 변경과 같은 트랜잭션 안에서 호출한다 (커밋은 호출하는 쪽에서)
+    c.execute(
+        "INSERT INTO match_events (request_id, mentor_id, mentee_id, type) VALUES (?, ?, ?, ?)",
+        (request_id, mentor_id, mentee_id, event_type),
+    )
+
+
+# 보관된 요청의 메시지는 archive 테이블에서 (두 테이블 모두 기본 키 조회. match_requests_all 뷰를 조인하면
+# UNION ALL 전체를 만들어서 스캔한다)
+MATCH_EVENTS_QUERY = """
+SELECT e.id, e.type, e.request_id, e.mentor_id, e.mentee_id, COALESCE(r.message, ra.message)
+FROM (
+    SELECT id, type, request_id, mentor_id, mentee_id FROM match_events WHERE mentor_id = ? AND id > ?
+    UNION ALL
+    SELECT id, type, request_id, mentor_id, mentee_id FROM match_events WHERE mentee_id = ? AND id > ?
+) e
+LEFT JOIN match_requests r ON r.id = e.request_id
+LEFT JOIN match_requests_archive ra ON ra.id = e.request_id
+ORDER BY e.id
+LIMIT ?
+"""
+
+
+def fetch_match_events(user_id, after_id, limit=BATCH_SIZE):
+    """user_id 가 멘토 또는 멘티로 관련된 이벤트 중 after_id 이후 것을 반환한다."""
+    with connection() as conn:
+        rows = conn.execute(
+            MATCH_EVENTS_QUERY,
+            (user_id, after_id, user_id, after_id, limit),
+        ).fetchall()
+    return [
+        {
+            "id": row[0],
+            "type": row[1],
+            "request": {
+                "id": row[2],
+                "mentorId": row[3],
+                "menteeId": row[4],
+                "message": row[5],
+                "status": EVENT_STATUS[row[1]],
+            },
+        }
+        for row in rows
+    ]
+
+
+def latest_event_id():
+    with connection() as conn:
+        return conn.execute("SELECT COALESCE(MAX(id), 0) FROM match_events").fetchone()[0]
+
+
+def event_users_since(after_id):
+    """after_id 이후 이벤트의 (마지막 id, 관련된 멘토/멘티 id 집합) 을 반환한다."""
+    with connection() as conn:
+        rows = conn.execute(
+            "SELECT id, mentor_id, mentee_id FROM match_events WHERE id > ? ORDER BY id", (after_id,)
+        ).fetchall()
+    if not rows:
+        return after_id, set()
+    return rows[-1][0], {user_id for row in rows for user_id in row[1:]}
+
+
+class EventBroker:
+    """SSE 구독자를 사용자별로 두고, 새 이벤트의 멘토/멘티 구독자만 깨운다.
+
+    새 이벤트 확인은 구독자가 있는 동안 프로세스당 하나의 디스패처가 한다.
+    같은 프로세스의 쓰기는 notify() 로 바로, 다른 워커가 기록한 이벤트는 POLL_INTERVAL 마다 확인한다.
+    notify() 는 동기 핸들러(스레드풀)에서도 호출되므로 이벤트 루프로 넘겨서 set 한다.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._loop = None
+        self._kick = None
+        self._last_id = None
+
+    def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(waiter)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._loop, self._kick = loop, asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+        return waiter
+
+    def unsubscribe(self, user_id, waiter):
+        with self._lock:
+            waiters = self._subscribers.get(user_id)
+            if waiters:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._subscribers[user_id]
+
+    def notify(self):
+        # 이 프로세스에서 이벤트를 커밋한 뒤 호출
+        loop, kick = self._loop, self._kick
+        if kick is None:
+            return
+        try:
+            loop.call_soon_threadsafe(kick.set)
+        except RuntimeError:
+            # 이미 닫힌 루프 (다음 구독 때 디스패처를 새로 만든다)
+            pass
+
+    def _wake(self, user_ids=None):
+        with self._lock:
+            if user_ids is None:
+                waiters = [w for group in self._subscribers.values() for w in group]
+            else:
+                waiters = [w for user_id in user_ids for w in self._subscribers.get(user_id, ())]
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass
+
+    async def _dispatch(self):
+        # 이벤트마다 한 번만 조회하고 관련된 사용자의 스트림만 깨운다
+        self._last_id = await run_in_threadpool(latest_event_id)
+        # 시작 위치를 읽는 사이에 기록된 이벤트를 놓치지 않도록 한 번은 모두 확인
+        self._wake()
+        while self._subscribers:
+            try:
+                await asyncio.wait_for(self._kick.wait(), POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._kick.clear()
+            self._last_id, user_ids = await run_in_threadpool(event_users_since, self._last_id)
+            if user_ids:
+                self._wake(user_ids)
+
+
+broker = EventBroker()
+
+
+def format_sse(event):
+    data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {data}\n\n"
+
+
+async def match_event_stream(request, user_id, last_event_id):
+    # last_event_id 이후 이벤트를 보낸다 (새 스트림이면 핸들러가 응답 전에 현재 MAX(id) 로 정함)
+    waiter = broker.subscribe(user_id)
+    wakeup = waiter[1]
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while not await request.is_disconnected():
+            wakeup.clear()
+            events = await run_in_threadpool(fetch_match_events, user_id, last_event_id)
+            for event in events:
+                last_event_id = event["id"]
+                yield format_sse(event)
+            if len(events) == BATCH_SIZE:
+                continue
+            try:
+                await asyncio.wait_for(wakeup.wait(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+    finally:
+        broker.unsubscribe(user_id, waiter)
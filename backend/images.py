@@ -0,0 +1,261 @@
+# 프로필 이미지 업로드/저장/리사이즈 (내용 해시 기반 저장소)
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.environ.get("STATIC_DIR", os.path.join(os.path.dirname(__file__), "static"))
+UPLOAD_TMP_DIR = os.path.join(STATIC_DIR, "tmp")
+
+MAX_IMAGE_BYTES = 1024 * 1024
+MIN_IMAGE_SIZE = 500
+MAX_IMAGE_SIZE = 1000
+# 목록/상세 화면용 리사이즈 크기 (정사각형 한 변 px)
+VARIANT_SIZES = (64, 160, 500)
+
+# 파일 시그니처 → (PIL 포맷, 확장자)
+SIGNATURES = {
+    b"\xff\xd8\xff": ("JPEG", "jpg"),
+    b"\x89PNG\r\n\x1a\n": ("PNG", "png"),
+}
+MEDIA_TYPES = {"jpg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+# 해시가 URL 에 들어간 요청은 내용이 절대 바뀌지 않으므로 오래 캐시
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "private, no-cache"
+
+# 리사이즈는 요청과 분리된 전용 워커에서 처리
+_variant_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-variants")
+
+
+def sniff_format(head):
+    for signature, fmt in SIGNATURES.items():
+        if head.startswith(signature):
+            return fmt
+    return None
+
+
+async def spool_upload(request):
+    """요청 본문을 임시 파일로 스트리밍 저장하고 (경로, 확장자, sha256) 을 반환한다.
+
+    Content-Length 가 크면 읽기 전에, 실제로 읽은 양이 상한을 넘으면 그 즉시 거절한다.
+    첫 청크에서 파일 시그니처를 확인해서 이미지가 아니면 나머지를 읽지 않는다.
+    """
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=413, detail="Image too large (max 1MB)")
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=UPLOAD_TMP_DIR, suffix=".upload")
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    ext = None
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if size > MAX_IMAGE_BYTES:
+                    raise HTTPException(status_code=413, detail="Image too large (max 1MB)")
+                if ext is None:
+                    head += chunk[:8]
+                    if len(head) >= 8:
+                        fmt = sniff_format(head)
+                        if not fmt:
+                            raise HTTPException(status_code=415, detail="Only jpg/png allowed")
+                        ext = fmt[1]
+                digest.update(chunk)
+                f.write(chunk)
+        if ext is None:
+            raise HTTPException(status_code=400, detail="Invalid image")
+        return path, ext, digest.hexdigest()
+    except BaseException:
+        discard(path)
+        raise
+
+
+def write_upload(data):
+    # 기존 base64 JSON 경로용: 디코드한 바이트를 같은 파이프라인에 태운다
+    if len(data) > MAX_IMAGE_BYTES:
+        raise HTTPException(status_code=400, detail="Image too large (max 1MB)")
+    fmt = sniff_format(data[:8])
+    if not fmt:
+        raise HTTPException(status_code=400, detail="Only jpg/png allowed")
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=UPLOAD_TMP_DIR, suffix=".upload")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path, fmt[1], hashlib.sha256(data).hexdigest()
+
+
+def validate_image(path, ext):
+    # 헤더만 읽어서 포맷/크기를 확인한 뒤 전체 구조 검증 (픽셀 디코드는 하지 않음)
+    try:
+        with Image.open(path) as img:
+            fmt, (w, h) = img.format, img.size
+            img.verify()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    if (fmt, ext) not in SIGNATURES.values():
+        raise HTTPException(status_code=400, detail="Only jpg/png allowed")
+    if w != h or w < MIN_IMAGE_SIZE or w > MAX_IMAGE_SIZE:
+        raise HTTPException(status_code=400, detail="Image must be square 500~1000px")
+
+
+def content_path(digest, ext, size=None):
+    # static/ab/abcdef....png, 리사이즈본은 static/ab/abcdef..._64.webp
+    name = f"{digest}_{size}.{ext}" if size else f"{digest}.{ext}"
+    return os.path.join(STATIC_DIR, digest[:2], name)
+
+
+def store_image(path, ext, digest):
+    """검증된 임시 파일을 해시 경로로 옮긴다. 같은 내용이 이미 있으면 False."""
+    target = content_path(digest, ext)
+    if os.path.exists(target):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+    return True
+
+
+def generate_variants(digest, ext):
+    # 각 크기별로 WebP 와 원본 포맷 두 가지를 만든다.
+    # 큰 것부터 만들어서 가장 작은 원본 포맷 파일이 있으면 생성이 끝난 것으로 본다
+    made = set()
+    with Image.open(content_path(digest, ext)) as img:
+        img.load()
+        for size in sorted(VARIANT_SIZES, reverse=True):
+            if size >= img.width:
+                continue
+            resized = img.resize((size, size), Image.LANCZOS)
+            resized.save(content_path(digest, "webp", size), "WEBP", quality=80, method=4)
+            if ext == "jpg":
+                resized.convert("RGB").save(content_path(digest, ext, size), "JPEG", quality=85, optimize=True)
+            else:
+                resized.save(content_path(digest, ext, size), "PNG", optimize=True)
+            made.update({(size, "webp"), (size, ext)})
+    return made
+
+
+def _generate_variants_logged(digest, ext):
+    try:
+        image_meta.set_variants(digest, generate_variants(digest, ext))
+    except Exception:
+        logger.exception("Failed to generate image variants for %s", digest)
+
+
+def schedule_variants(digest, ext):
+    return _variant_executor.submit(_generate_variants_logged, digest, ext)
+
+
+def save_profile_image(path, ext, digest):
+    # 검증 → 저장 → (새 내용이면) 리사이즈 예약
+    try:
+        validate_image(path, ext)
+        is_new = store_image(path, ext, digest)
+    finally:
+        discard(path)
+    if is_new:
+        schedule_variants(digest, ext)
+    return digest
+
+
+def profile_image_url(role, user_id, digest):
+    # v 파라미터가 현재 해시와 같으면 immutable 로 응답한다
+    return f"/api/images/{role}/{user_id}?v={digest}"
+
+
+class ImageMetaCache:
+    """프로필 → (해시, 확장자), 해시 → 생성된 리사이즈본 목록을 메모리에 둔다.
+
+    프로필 항목은 TTL 이 지나면 DB 에서 다시 읽어서 다른 워커의 업로드도 반영된다.
+    해시 항목은 내용이 바뀌지 않으므로 만료가 없다.
+    """
+
+    def __init__(self, ttl=30.0, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._profiles = {}
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def get_profile(self, role, user_id, load):
+        now = time.monotonic()
+        key = (role, user_id)
+        entry = self._profiles.get(key)
+        if entry and entry[1] > now:
+            return entry[0]
+        meta = load(role, user_id)
+        self.set_profile(role, user_id, meta)
+        return meta
+
+    def clear(self):
+        with self._lock:
+            self._profiles.clear()
+            self._variants.clear()
+
+    def set_profile(self, role, user_id, meta):
+        with self._lock:
+            if len(self._profiles) >= self.maxsize:
+                self._profiles.clear()
+            self._profiles[(role, user_id)] = (meta, time.monotonic() + self.ttl)
+
+    def variants(self, digest, ext):
+        found = self._variants.get(digest)
+        if found is None:
+            # 재시작 후 처음 요청될 때 한 번만 디스크를 확인
+            found = {
+                (size, fmt)
+                for size in VARIANT_SIZES
+                for fmt in ("webp", ext)
+                if os.path.exists(content_path(digest, fmt, size))
+            }
+            # 아직 생성 중이면 다음 요청에서 다시 확인
+            if (VARIANT_SIZES[0], ext) in found:
+                self.set_variants(digest, found)
+        return found
+
+    def set_variants(self, digest, found):
+        with self._lock:
+            if len(self._variants) >= self.maxsize:
+                self._variants.clear()
+            self._variants[digest] = found
+
+
+image_meta = ImageMetaCache()
+
+
+def resolve_image(digest, ext, size=None, accept_webp=False):
+    """요청 크기 이상인 가장 작은 리사이즈본, 없으면 원본을 (경로, media_type, etag) 로 반환."""
+    if size:
+        available = image_meta.variants(digest, ext)
+        for variant in VARIANT_SIZES:
+            if variant < size:
+                continue
+            for fmt in (("webp", ext) if accept_webp else (ext,)):
+                if (variant, fmt) in available:
+                    return content_path(digest, fmt, variant), MEDIA_TYPES[fmt], f'"{digest}-{variant}.{fmt}"'
+    return content_path(digest, ext), MEDIA_TYPES[ext], f'"{digest}.{ext}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+
+
+def discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,20 +1,57 @@
-from fastapi import FastAPI, HTTPException, Depends, Request, status, Body
-from fastapi.responses import JSONResponse, FileResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Depends, Request, Response, status, Body
+from fastapi.responses import JSONResponse, FileResponse, RedirectResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.concurrency import run_in_threadpool
 import sqlite3
 from pydantic import BaseModel, EmailStr
-from passlib.hash import bcrypt
-import jwt
 import os
-import importlib.util
-import uuid
-import time
-from PIL import Image
-import io
-from typing import Optional
-
-app = FastAPI(openapi_url="/api/openapi.json", docs_url="/")
+import asyncio
+import base64
+import hmac
+import logging
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+from db import get_db, connection, immediate_transaction, PoolExhausted, pool, database
+from migrations import migrate
+from archive import archive_loop, ARCHIVE_INTERVAL
+from replica import replica
+from passwords import password_hasher, HasherBusy
+from throttle import login_throttle, LoginThrottled
+from tokens import issue_token, verify_token, cached_token_payload, revoke_token, load_revocations, token_cache
+from search import normalize_skills, sync_mentor_index, skill_filter, fts_query
+from images import (
+    spool_upload, write_upload, save_profile_image, profile_image_url, image_meta, resolve_image,
+    etag_matches, IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL,
+)
+from events import record_match_event, broker, match_event_stream, latest_event_id
+from cache import mentor_cache
+from recommend import mentor_index, recommend_for_mentee
+from metrics import MetricsMiddleware, registry, render_metrics
+from pagination import check_limit, decode_cursor, encode_cursor, set_page_headers, MAX_LIMIT, NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 워커 시작 시 한 번: 스키마를 최신 버전으로 올리고 (이미 최신이면 버전 조회만) 폐기 목록 로드
+    await run_in_threadpool(migrate, database.path)
+    await run_in_threadpool(load_revocations)
+    archiver = asyncio.create_task(archive_loop(database)) if ARCHIVE_INTERVAL > 0 else None
+    refresher = None
+    if replica.enabled:
+        # 첫 스냅샷은 기다려서 만들고 이후는 백그라운드에서 갱신
+        await run_in_threadpool(replica.remove_stale_files)
+        await run_in_threadpool(replica.refresh)
+        refresher = asyncio.create_task(replica.refresh_loop())
+    yield
+    for task in (archiver, refresher):
+        if task:
+            task.cancel()
+    database.close()
+    replica.close()
+
+app = FastAPI(openapi_url="/api/openapi.json", docs_url="/", lifespan=lifespan)
 
 # CORS 설정 (프론트엔드와 통신 허용)
 app.add_middleware(
@@ -23,30 +60,38 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER, "X-Cache"],
 )
+# 가장 바깥에서 라우트별 지연 시간/상태 코드 기록
+app.add_middleware(MetricsMiddleware)
 
 security = HTTPBearer()
 
-# DB 연결 함수
-DB_PATH = "app.db"
-
-def init_db():
-    # init_db.py를 import해서 실행
-    import importlib.util
-    import os
-    db_init_path = os.path.join(os.path.dirname(__file__), "init_db.py")
-    spec = importlib.util.spec_from_file_location("init_db", db_init_path)
-    db_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(db_module)
+# 에러 핸들러
+@app.exception_handler(PoolExhausted)
+async def pool_exhausted_handler(request: Request, exc: PoolExhausted):
+    return JSONResponse(
+        status_code=503,
+        content={"error": "Service unavailable", "details": str(exc)},
+        headers={"Retry-After": "1"},
+    )
 
-init_db()  # 앱 시작 시 DB 초기화
+@app.exception_handler(HasherBusy)
+async def hasher_busy_handler(request: Request, exc: HasherBusy):
+    return JSONResponse(
+        status_code=429,
+        content={"error": "Too many requests", "details": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+@app.exception_handler(LoginThrottled)
+async def login_throttled_handler(request: Request, exc: LoginThrottled):
+    return JSONResponse(
+        status_code=429,
+        content={"error": "Too many requests", "details": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
-# 에러 핸들러
 @app.exception_handler(Exception)
 async def internal_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
@@ -55,28 +100,51 @@ async def internal_exception_handler(request: Request, exc: Exception):
     )
 
 # JWT 기반 인증 의존성
-SECRET_KEY = "dev-secret"  # 실제 서비스에서는 환경변수 사용
-
-def decode_jwt(token: str):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"], audience="mentor-mentee-client")
-        return payload
-    except Exception as e:
-        print(e)
-        return None
-
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    token = credentials.credentials
-    payload = decode_jwt(token)
+async def authenticate(token: str):
+    # 캐시 히트면 이벤트 루프에서 바로 처리, 미스일 때만 검증 + 폐기 여부 DB 조회
+    payload = cached_token_payload(token)
+    if payload is None:
+        payload = await run_in_threadpool(verify_token, token)
     if not payload:
         raise HTTPException(status_code=401, detail="Unauthorized")
     return payload
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate(credentials.credentials)
+
 # 기본 라우트 예시
 @app.get("/api/health")
 def health():
     return {"status": "ok"}
 
+# /api/metrics 는 METRICS_TOKEN 을 설정했을 때만 열리고 Authorization: Bearer <METRICS_TOKEN> 이 있어야 조회 가능
+# (SQL 문 라벨 등 내부 정보가 들어 있으므로 설정이 없으면 404)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+def collect_runtime_metrics():
+    created, idle = pool.stats()
+    return [
+        ("db_pool_connections", "gauge", "Open pooled SQLite connections.", created),
+        ("db_pool_idle_connections", "gauge", "Pooled connections waiting to be borrowed.", idle),
+        ("password_hash_pending", "gauge", "Queued or running bcrypt jobs.", password_hasher.pending),
+        ("login_throttled_total", "counter", "Login attempts rejected before password check.", login_throttle.rejected),
+        ("read_replica_refreshes_total", "counter", "Read snapshots taken by this worker.", replica.refreshes),
+        ("token_cache_entries", "gauge", "Verified tokens in the cache.", len(token_cache)),
+        ("mentor_cache_hits_total", "counter", "Mentor list responses served from cache.", mentor_cache.hits),
+        ("mentor_cache_misses_total", "counter", "Mentor list responses rebuilt.", mentor_cache.misses),
+    ]
+
+registry.add_collector(collect_runtime_metrics)
+
+@app.get("/api/metrics", include_in_schema=False)
+def metrics(request: Request):
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    expected = f"Bearer {METRICS_TOKEN}".encode()
+    if not hmac.compare_digest(request.headers.get("authorization", "").encode(), expected):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # 회원가입 관련 모델
 class SignupRequest(BaseModel):
     email: EmailStr
@@ -85,93 +153,122 @@ class SignupRequest(BaseModel):
     role: str  # mentor or mentee
 
 # 회원가입
+def create_user(data: SignupRequest, hashed_pw: str):
+    with connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute(
+                "INSERT INTO users (email, password, name, role) VALUES (?, ?, ?, ?)",
+                (data.email, hashed_pw, data.name, data.role)
+            )
+            user_id = c.lastrowid
+            if data.role == "mentor":
+                c.execute("INSERT INTO mentor_profiles (user_id, bio, image_url, skills) VALUES (?, '', '', '')", (user_id,))
+                sync_mentor_index(c, user_id, data.name, "", [])
+            else:
+                c.execute("INSERT INTO mentee_profiles (user_id, bio, image_url) VALUES (?, '', '')", (user_id,))
+            conn.commit()
+        except sqlite3.IntegrityError:
+            raise HTTPException(status_code=400, detail="Email already exists")
+    replica.note_write(user_id)
+    if data.role == "mentor":
+        mentor_cache.invalidate()
+        mentor_index.update_mentor(user_id, [], "")
+
 @app.post("/api/signup", status_code=201)
-def signup(data: SignupRequest = Body(...)):
-    conn = get_db()
-    c = conn.cursor()
-    try:
-        hashed_pw = bcrypt.hash(data.password)
-        c.execute(
-            "INSERT INTO users (email, password, name, role) VALUES (?, ?, ?, ?)",
-            (data.email, hashed_pw, data.name, data.role)
-        )
-        user_id = c.lastrowid
-        if data.role == "mentor":
-            c.execute("INSERT INTO mentor_profiles (user_id, bio, image_url, skills) VALUES (?, '', '', '')", (user_id,))
-        else:
-            c.execute("INSERT INTO mentee_profiles (user_id, bio, image_url) VALUES (?, '', '')", (user_id,))
-        conn.commit()
-        return {"message": "User created"}
-    except sqlite3.IntegrityError:
-        raise HTTPException(status_code=400, detail="Email already exists")
-    finally:
-        conn.close()
+async def signup(data: SignupRequest = Body(...)):
+    # bcrypt 는 전용 워커 풀에서, DB 작업은 스레드풀에서 처리 (커넥션은 해시 후에 빌림)
+    hashed_pw = await password_hasher.hash(data.password)
+    await run_in_threadpool(create_user, data, hashed_pw)
+    return {"message": "User created"}
 
 # 로그인
 class LoginRequest(BaseModel):
     email: EmailStr
     password: str
 
+def find_login_user(email: str):
+    with connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, password, name, email, role FROM users WHERE email = ?", (email,))
+        return c.fetchone()
+
+def update_password_hash(user_id: int, hashed_pw: str):
+    with connection() as conn:
+        conn.execute("UPDATE users SET password=? WHERE id=?", (hashed_pw, user_id))
+        conn.commit()
+
+async def call_throttle(fn, *args):
+    # 메모리 백엔드는 이벤트 루프에서 바로, 공유(SQLite) 백엔드는 스레드풀에서
+    if login_throttle.backend.in_process:
+        return fn(*args)
+    return await run_in_threadpool(fn, *args)
+
 @app.post("/api/login")
-def login(data: LoginRequest = Body(...)):
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT id, password, name, email, role FROM users WHERE email = ?", (data.email,))
-    user = c.fetchone()
-    conn.close()
-    if not user or not bcrypt.verify(data.password, user[1]):
+async def login(request: Request, data: LoginRequest = Body(...)):
+    # 한도를 넘은 시도는 DB 조회와 bcrypt 전에 거절
+    client_ip = request.client.host if request.client else "unknown"
+    await call_throttle(login_throttle.check, data.email, client_ip)
+    user = await run_in_threadpool(find_login_user, data.email)
+    if not user:
+        await password_hasher.verify_unknown(data.password)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    ok, new_hash = await password_hasher.verify(data.password, user[1])
+    if not ok:
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    now = int(time.time())
-    payload = {
-        "iss": "mentor-mentee-app",
-        "sub": str(user[0]),
-        "user_id": user[0],
-        "aud": "mentor-mentee-client",
-        "exp": now + 3600,
-        "nbf": now,
-        "iat": now,
-        "jti": str(uuid.uuid4()),
-        "name": user[2],
-        "email": user[3],
-        "role": user[4]
-    }
-    token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+    await call_throttle(login_throttle.succeeded, data.email)
+    if new_hash:
+        await run_in_threadpool(update_password_hash, user[0], new_hash)
+    token = issue_token(user[0], user[2], user[3], user[4])
     return {"token": token}
 
+# 로그아웃: 현재 토큰 폐기
+@app.post("/api/logout")
+async def logout(user=Depends(get_current_user)):
+    await run_in_threadpool(revoke_token, user)
+    return {"result": "logged out"}
+
 # 내 정보 조회
-@app.get("/api/me")
-def get_me(user=Depends(get_current_user)):
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT id, email, name, role FROM users WHERE id = ?", (user["user_id"],))
-    u = c.fetchone()
-    if not u:
-        conn.close()
+# 프로필 응답은 버전 ETag 로 재검증 (같은 URL 을 다른 사용자가 쓰므로 ETag 에 id 포함)
+PROFILE_CACHE_HEADERS = {"Cache-Control": REVALIDATE_CACHE_CONTROL, "Vary": "Authorization"}
+
+def profile_etag(user_id: int, version: int):
+    return f'"{user_id}-{version}"'
+
+def load_profile_version(conn, user_id: int):
+    return conn.execute("SELECT role, profile_version FROM users WHERE id = ?", (user_id,)).fetchone()
+
+def load_profile(conn, user_id: int):
+    # user_profiles 뷰: users + 역할별 프로필 테이블을 한 번에
+    return conn.execute(
+        "SELECT id, email, name, role, profile_version, bio, image_url, skills FROM user_profiles WHERE id = ?",
+        (user_id,)
+    ).fetchone()
+
+def profile_body(row):
+    profile = {"name": row[2], "bio": row[5], "imageUrl": row[6] or None}
+    if row[3] == "mentor":
+        profile["skills"] = row[7].split(",") if row[7] else []
+    return {"id": row[0], "email": row[1], "role": row[3], "profile": profile}
+
+async def conditional_profile(request: Request, user_id: int, session: int, role: Optional[str] = None):
+    """If-None-Match 가 현재 버전이면 버전만 조회하고 304, 아니면 프로필을 조회해서 ETag 와 함께 반환한다."""
+    snapshot = replica.current(session)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        row = await database.read(load_profile_version, user_id, snapshot=snapshot)
+        if row and role in (None, row[0]):
+            etag = profile_etag(user_id, row[1])
+            if etag_matches(if_none_match, etag):
+                return Response(status_code=304, headers={**PROFILE_CACHE_HEADERS, "ETag": etag})
+    row = await database.read(load_profile, user_id, snapshot=snapshot)
+    if not row or role not in (None, row[3]):
         raise HTTPException(status_code=404, detail="User not found")
-    # 프로필 정보
-    if u[3] == "mentor":
-        c.execute("SELECT bio, image_url, skills FROM mentor_profiles WHERE user_id = ?", (u[0],))
-        p = c.fetchone()
-        image_url = p[1] if p and p[1] else None
-        profile = {
-            "name": u[2],
-            "bio": p[0] if p else "",
-            "imageUrl": image_url,
-            "skills": (p[2].split(",") if p and p[2] else [])
-        }
-        conn.close()
-        return {"id": u[0], "email": u[1], "role": u[3], "profile": profile}
-    else:
-        c.execute("SELECT bio, image_url FROM mentee_profiles WHERE user_id = ?", (u[0],))
-        p = c.fetchone()
-        image_url = p[1] if p and p[1] else None
-        profile = {
-            "name": u[2],
-            "bio": p[0] if p else "",
-            "imageUrl": image_url
-        }
-        conn.close()
-        return {"id": u[0], "email": u[1], "role": u[3], "profile": profile}
+    return JSONResponse(profile_body(row), headers={**PROFILE_CACHE_HEADERS, "ETag": profile_etag(user_id, row[4])})
+
+@app.get("/api/me")
+async def get_me(request: Request, user=Depends(get_current_user)):
+    return await conditional_profile(request, user["user_id"], user["user_id"])
 
 # 프로필 수정 (멘토/멘티)
 class UpdateProfileRequest(BaseModel):
@@ -182,97 +279,250 @@ class UpdateProfileRequest(BaseModel):
     image: str  # base64
     skills: Optional[list[str]] = None
 
-from fastapi import UploadFile
-import base64
+PROFILE_TABLES = {"mentor": "mentor_profiles", "mentee": "mentee_profiles"}
+
+def decode_base64_image(base64_str):
+    # 기존 JSON(base64) 업로드 호환 경로. 새 클라이언트는 PUT /api/profile/image 사용
+    try:
+        img_bytes = base64.b64decode(base64_str)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+    path, ext, digest = write_upload(img_bytes)
+    save_profile_image(path, ext, digest)
+    return digest, ext
 
 @app.put("/api/profile")
 def update_profile(
     user=Depends(get_current_user),
     data: UpdateProfileRequest = None,
+    conn=Depends(get_db),
 ):
-    conn = get_db()
     c = conn.cursor()
-    image_url = ""
-    # 이미지 저장 및 검증 함수
-    def save_profile_image(base64_str, role, user_id):
-        if not base64_str or len(base64_str) == 0:
-            return ""
-        try:
-            img_bytes = base64.b64decode(base64_str)
-            if len(img_bytes) > 1024*1024:
-                raise HTTPException(status_code=400, detail="Image too large (max 1MB)")
-            img = Image.open(io.BytesIO(img_bytes))
-            if img.format not in ["JPEG", "PNG"]:
-                raise HTTPException(status_code=400, detail="Only jpg/png allowed")
-            w, h = img.size
-            if w != h or w < 500 or w > 1000:
-                raise HTTPException(status_code=400, detail="Image must be square 500~1000px")
-            ext = "jpg" if img.format == "JPEG" else "png"
-            static_dir = os.path.join(os.path.dirname(__file__), "static")
-            os.makedirs(static_dir, exist_ok=True)
-            filename = f"{role}_{user_id}.{ext}"
-            path = os.path.join(static_dir, filename)
-            img.save(path)
-            return f"/api/images/{role}/{user_id}"
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
-    if user["role"] == "mentor" and data:
-        image_url = save_profile_image(data.image, "mentor", user["user_id"])
-        c.execute("UPDATE users SET name=? WHERE id=?", (data.name, user["user_id"]))
+    if not data or user["role"] not in PROFILE_TABLES:
+        logger.info("Invalid profile update request from user %s", user["user_id"])
+        raise HTTPException(status_code=400, detail="Invalid request")
+    role = user["role"]
+    table = PROFILE_TABLES[role]
+    # 이미지가 없으면 기존 이미지를 유지
+    if data.image:
+        digest, ext = decode_base64_image(data.image)
         c.execute(
-            "UPDATE mentor_profiles SET bio=?, image_url=?, skills=? WHERE user_id=?",
-            (data.bio, image_url, ",".join(data.skills), user["user_id"])
+            f"UPDATE {table} SET image_url=?, image_hash=?, image_ext=? WHERE user_id=?",
+            (profile_image_url(role, user["user_id"], digest), digest, ext, user["user_id"])
         )
-        conn.commit()
-        return {"result": "ok", "imageUrl": image_url}
-    elif user["role"] == "mentee" and data:
-        image_url = save_profile_image(data.image, "mentee", user["user_id"])
-        c.execute("UPDATE users SET name=? WHERE id=?", (data.name, user["user_id"]))
+        image_meta.set_profile(role, user["user_id"], (digest, ext))
+    c.execute("UPDATE users SET name=?, profile_version=profile_version+1 WHERE id=?", (data.name, user["user_id"]))
+    if role == "mentor":
+        skills = normalize_skills(data.skills)
         c.execute(
-            "UPDATE mentee_profiles SET bio=?, image_url=? WHERE user_id=?",
-            (data.bio, image_url, user["user_id"])
+            "UPDATE mentor_profiles SET bio=?, skills=? WHERE user_id=?",
+            (data.bio, ",".join(skills), user["user_id"])
         )
-        conn.commit()
-        return {"result": "ok", "imageUrl": image_url}
+        sync_mentor_index(c, user["user_id"], data.name, data.bio, skills)
     else:
-        print(data)
+        c.execute(
+            "UPDATE mentee_profiles SET bio=? WHERE user_id=?",
+            (data.bio, user["user_id"])
+        )
+    c.execute(f"SELECT image_url FROM {table} WHERE user_id=?", (user["user_id"],))
+    row = c.fetchone()
+    conn.commit()
+    replica.note_write(user["user_id"])
+    if role == "mentor":
+        mentor_cache.invalidate()
+        mentor_index.update_mentor(user["user_id"], skills, data.bio)
+    return {"result": "ok", "imageUrl": row[0] if row and row[0] else ""}
+
+# 프로필 이미지 업로드 (본문 = jpg/png 원본 바이트 스트림)
+def set_profile_image(role: str, user_id: int, digest: str, ext: str):
+    image_url = profile_image_url(role, user_id, digest)
+    with connection() as conn:
+        conn.execute(
+            f"UPDATE {PROFILE_TABLES[role]} SET image_url=?, image_hash=?, image_ext=? WHERE user_id=?",
+            (image_url, digest, ext, user_id)
+        )
+        conn.execute("UPDATE users SET profile_version=profile_version+1 WHERE id=?", (user_id,))
+        conn.commit()
+    image_meta.set_profile(role, user_id, (digest, ext))
+    if role == "mentor":
+        mentor_cache.invalidate()
+    return image_url
+
+@app.put("/api/profile/image")
+async def upload_profile_image(request: Request, user=Depends(get_current_user)):
+    role = user["role"]
+    if role not in PROFILE_TABLES:
         raise HTTPException(status_code=400, detail="Invalid request")
+    path, ext, digest = await spool_upload(request)
+    # 검증/저장은 스레드풀에서, 리사이즈는 백그라운드 워커에서 처리되고 응답은 바로 반환
+    await run_in_threadpool(save_profile_image, path, ext, digest)
+    image_url = await run_in_threadpool(set_profile_image, role, user["user_id"], digest, ext)
+    replica.note_write(user["user_id"])
+    return {"result": "ok", "imageUrl": image_url}
 
 # 멘토 목록 조회
 from typing import Optional
 
-@app.get("/api/mentors")
-def get_mentors(skill: Optional[str] = None, orderBy: Optional[str] = None, user=Depends(get_current_user)):
-    if user["role"] != "mentee":
-        raise HTTPException(status_code=401, detail="Only mentee can access mentor list")
-    conn = get_db()
+# 프로필 필드 → mentor_profiles/users 컬럼
+MENTOR_PROFILE_COLUMNS = {
+    "name": "u.name",
+    "bio": "p.bio",
+    "imageUrl": "p.image_url",
+    "skills": "p.skills",
+}
+
+# 목록 응답용: 프로필 필드 → JSON 값 식 (SQLite 가 행 단위 JSON 을 바로 만든다)
+# 서브쿼리 결과는 JSON 타입 정보가 사라지므로 json() 으로 감싸야 문자열이 아닌 배열로 들어간다
+MENTOR_PROFILE_JSON = {
+    "name": "u.name",
+    "bio": "p.bio",
+    "imageUrl": "p.image_url",
+    "skills": "json((SELECT json_group_array(skill) FROM (SELECT skill FROM mentor_skills s WHERE s.user_id = u.id ORDER BY s.position)))",
+}
+
+def mentor_json(selected):
+    profile = ", ".join(f"'{f}', {MENTOR_PROFILE_JSON[f]}" for f in selected)
+    return f"json_object('id', u.id, 'email', u.email, 'role', u.role, 'profile', json_object({profile}))"
+
+def json_array(rows, column):
+    # 행마다 SQL 에서 만든 JSON 객체 문자열을 이어 붙여서 응답 본문을 만든다 (dict/인코더를 거치지 않음)
+    return ("[" + ",".join(row[column] for row in rows) + "]").encode()
+
+# orderBy 값 → 키셋 정렬 키 (동점은 항상 u.id 로 구분)
+MENTOR_SORT_KEYS = {
+    "name": "u.name",
+    # 멘토의 스킬 중 사전순으로 가장 앞선 스킬 기준
+    "skill": "COALESCE((SELECT MIN(skill_key) FROM mentor_skills s WHERE s.user_id = u.id), '')",
+}
+
+def build_mentor_page(conn, skill, orderBy, q, limit, cursor, selected):
+    """멘토 목록 한 페이지를 조회해서 (JSON 본문 bytes, 다음 커서, 전체 개수) 를 반환한다."""
     c = conn.cursor()
-    query = "SELECT u.id, u.email, u.role, u.name, p.bio, p.image_url, p.skills FROM users u JOIN mentor_profiles p ON u.id = p.user_id WHERE u.role = 'mentor'"
+    where = "u.role = 'mentor'"
     params = []
     if skill:
-        query += " AND p.skills LIKE ?"
-        params.append(f"%{skill}%")
-    if orderBy == "skill":
-        query += " ORDER BY p.skills ASC"
-    elif orderBy == "name":
-        query += " ORDER BY u.name ASC"
+        cond, cond_params = skill_filter(skill)
+        where += " AND " + cond
+        params.extend(cond_params)
+    # 이름/소개/스킬 전문 검색
+    match = fts_query(q) if q else None
+    if match:
+        where += " AND u.id IN (SELECT rowid FROM mentor_search WHERE mentor_search MATCH ?)"
+        params.append(match)
+    from_clause = " FROM users u JOIN mentor_profiles p ON u.id = p.user_id WHERE "
+    # 전체 개수는 첫 페이지에서만 계산
+    total = None
+    if limit and not cursor:
+        c.execute("SELECT COUNT(*)" + from_clause + where, params)
+        total = c.fetchone()[0]
+    sort_key = MENTOR_SORT_KEYS.get(orderBy)
+    if cursor:
+        if sort_key:
+            where += f" AND ({sort_key}, u.id) > (?, ?)"
+            params.extend(decode_cursor(cursor, 2))
+        else:
+            where += " AND u.id > ?"
+            params.extend(decode_cursor(cursor, 1))
+    query = f"SELECT u.id, {sort_key or 'NULL'}, {mentor_json(selected)}" + from_clause + where
+    query += f" ORDER BY {sort_key}, u.id" if sort_key else " ORDER BY u.id"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit + 1)
     c.execute(query, params)
-    mentors = [
-        {
-            "id": row[0],
-            "email": row[1],
-            "role": row[2],
-            "profile": {
-                "name": row[3],
-                "bio": row[4],
-                "imageUrl": row[5],
-                "skills": row[6].split(",") if row[6] else []
-            }
-        }
-        for row in c.fetchall()
-    ]
+    rows = c.fetchall()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last[1], last[0]] if sort_key else [last[0]])
+    if not limit:
+        total = len(rows)
+    return json_array(rows, 2), next_cursor, total
+
+async def call_cache(fn, *args, **kwargs):
+    # 메모리 캐시는 이벤트 루프에서 바로, 공유(SQLite) 캐시는 스레드풀에서 (call_throttle 과 같은 방식)
+    if mentor_cache.backend.in_process:
+        return fn(*args, **kwargs)
+    return await run_in_threadpool(fn, *args, **kwargs)
+
+@app.get("/api/mentors")
+async def get_mentors(
+    skill: Optional[str] = None,
+    orderBy: Optional[str] = None,
+    q: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    user=Depends(get_current_user),
+):
+    if user["role"] != "mentee":
+        raise HTTPException(status_code=401, detail="Only mentee can access mentor list")
+    check_limit(limit)
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in MENTOR_PROFILE_COLUMNS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    else:
+        selected = list(MENTOR_PROFILE_COLUMNS)
+    # 결과는 요청한 멘티와 무관하므로 조회 조건만으로 캐시
+    # 스냅샷에서 읽은 결과는 그 스냅샷 시각을 키에 넣어서 스냅샷이 바뀌면 다시 계산 (최대 지연 유지)
+    snapshot = replica.current()
+    key = await call_cache(
+        mentor_cache.key,
+        skill=skill, orderBy=orderBy, q=q, limit=limit, cursor=cursor, fields=selected,
+        snapshot=snapshot.taken_at if snapshot else None,
+    )
+    cached = await call_cache(mentor_cache.get, key)
+    if cached:
+        body, headers = cached
+        return Response(content=body, media_type="application/json", headers={**headers, "X-Cache": "HIT"})
+    body, next_cursor, total = await database.read(
+        build_mentor_page, skill, orderBy, q, limit, cursor, selected, snapshot=snapshot,
+    )
+    response = Response(content=body, media_type="application/json")
+    set_page_headers(response, next_cursor, total)
+    headers = {k: response.headers[k] for k in (NEXT_CURSOR_HEADER, TOTAL_COUNT_HEADER) if k in response.headers}
+    await call_cache(mentor_cache.set, key, body, headers)
+    response.headers["X-Cache"] = "MISS"
+    return response
+
+# 추천 멘토: 멘티 소개/요청 이력과 멘토 스킬·소개의 유사도 + 수락률
+def load_recommended_mentors(conn, mentee_id: int, limit: int):
+    ranked = recommend_for_mentee(conn, mentee_id, limit)
+    if not ranked:
+        return []
+    columns = ", ".join(MENTOR_PROFILE_COLUMNS.values())
+    rows = conn.execute(
+        f"SELECT u.id, u.email, u.role, {columns} FROM users u JOIN mentor_profiles p ON u.id = p.user_id"
+        f" WHERE u.id IN ({', '.join('?' for _ in ranked)})",
+        [mentor_id for mentor_id, _ in ranked],
+    ).fetchall()
+    by_id = {row[0]: row for row in rows}
+    mentors = []
+    for mentor_id, score in ranked:
+        row = by_id.get(mentor_id)
+        if row is None:
+            continue
+        profile = dict(zip(MENTOR_PROFILE_COLUMNS, row[3:]))
+        profile["skills"] = profile["skills"].split(",") if profile["skills"] else []
+        mentors.append({"id": row[0], "email": row[1], "role": row[2], "profile": profile, "score": score})
     return mentors
 
+@app.get("/api/mentors/recommended")
+async def get_recommended_mentors(limit: int = 10, user=Depends(get_current_user)):
+    if user["role"] != "mentee":
+        raise HTTPException(status_code=401, detail="Only mentee can access mentor list")
+    check_limit(limit)
+    return await database.read(load_recommended_mentors, user["user_id"], limit)
+
+# 멘토 프로필 조회 (멘티 전용, /api/me 와 같은 ETag 재검증)
+@app.get("/api/mentors/{id}")
+async def get_mentor(request: Request, id: int, user=Depends(get_current_user)):
+    if user["role"] != "mentee":
+        raise HTTPException(status_code=401, detail="Only mentee can access mentor list")
+    return await conditional_profile(request, id, user["user_id"], role="mentor")
+
 # 매칭 요청 관련 모델
 class MatchRequestCreate(BaseModel):
     mentorId: int
@@ -287,135 +537,326 @@ class MatchRequest(BaseModel):
     status: str
 
 # 매칭 요청 생성
+def insert_match_request(conn, data: MatchRequestCreate):
+    c = conn.cursor()
+    try:
+        # 검사와 INSERT 를 하나의 쓰기 트랜잭션으로 묶어서 동시 요청에도 규칙 유지
+        with immediate_transaction(conn):
+            # 멘토 존재 확인
+            c.execute("SELECT id FROM users WHERE id=? AND role='mentor'", (data.mentorId,))
+            if not c.fetchone():
+                raise HTTPException(status_code=400, detail="Mentor not found")
+            # 멘티의 진행 중 요청 (idx_match_requests_mentee_status)
+            c.execute(
+                "SELECT mentor_id, status FROM match_requests WHERE mentee_id=? AND status IN ('pending', 'accepted')",
+                (data.menteeId,)
+            )
+            active = c.fetchall()
+            # 한 멘토에게 한 번만 요청 가능
+            if any(row[0] == data.mentorId for row in active):
+                raise HTTPException(status_code=400, detail="Already requested to this mentor")
+            # 멘토가 수락/거절하기 전까지 다른 멘토에게 중복 요청 불가
+            if any(row[1] == "pending" for row in active):
+                raise HTTPException(status_code=400, detail="You have a pending request to another mentor")
+            c.execute(
+                "INSERT INTO match_requests (mentor_id, mentee_id, message, status) VALUES (?, ?, ?, 'pending')",
+                (data.mentorId, data.menteeId, data.message)
+            )
+            req_id = c.lastrowid
+            record_match_event(c, "created", req_id, data.mentorId, data.menteeId)
+    except sqlite3.IntegrityError:
+        # 부분 유니크 인덱스 위반 (검사를 우회한 동시 요청)
+        raise HTTPException(status_code=400, detail="Already requested to this mentor")
+    return req_id
+
 @app.post("/api/match-requests")
-def create_match_request(data: MatchRequestCreate, user=Depends(get_current_user)):
+async def create_match_request(data: MatchRequestCreate, user=Depends(get_current_user)):
     if user["role"] != "mentee" or user["user_id"] != data.menteeId:
         raise HTTPException(status_code=401, detail="Only mentee can send match request for self")
-    conn = get_db()
-    c = conn.cursor()
-    # 멘토 존재 확인
-    c.execute("SELECT id FROM users WHERE id=? AND role='mentor'", (data.mentorId,))
-    if not c.fetchone():
-        conn.close()
-        raise HTTPException(status_code=400, detail="Mentor not found")
-    # 한 멘토에게 한 번만 요청 가능
-    c.execute("SELECT id FROM match_requests WHERE mentor_id=? AND mentee_id=? AND status IN ('pending', 'accepted')", (data.mentorId, data.menteeId))
-    if c.fetchone():
-        conn.close()
-        raise HTTPException(status_code=400, detail="Already requested to this mentor")
-    # 멘토가 수락/거절하기 전까지 다른 멘토에게 중복 요청 불가
-    c.execute("SELECT id FROM match_requests WHERE mentee_id=? AND status='pending'", (data.menteeId,))
-    if c.fetchone():
-        conn.close()
-        raise HTTPException(status_code=400, detail="You have a pending request to another mentor")
-    c.execute(
-        "INSERT INTO match_requests (mentor_id, mentee_id, message, status) VALUES (?, ?, ?, 'pending')",
-        (data.mentorId, data.menteeId, data.message)
-    )
-    conn.commit()
-    req_id = c.lastrowid
-    conn.close()
+    req_id = await database.write(insert_match_request, data)
+    replica.note_write(user["user_id"])
+    broker.notify()
     return {"id": req_id, "mentorId": data.mentorId, "menteeId": data.menteeId, "message": data.message, "status": "pending"}
 
+# 매칭 요청 목록 항목 (JSON 객체 식)
+INCOMING_REQUEST_JSON = "json_object('id', id, 'mentorId', mentor_id, 'menteeId', mentee_id, 'message', message, 'status', status)"
+OUTGOING_REQUEST_JSON = "json_object('id', id, 'mentorId', mentor_id, 'menteeId', mentee_id, 'status', status)"
+
+def list_match_requests(conn, item_json, owner_column, owner_id, limit, cursor, include_archived=False):
+    # 매칭 요청 목록 공통: id 기준 키셋 페이지네이션 → (JSON 본문 bytes, 다음 커서, 전체 개수)
+    # include_archived 면 보관된 거절/취소 요청까지 (match_requests_all 뷰)
+    table = "match_requests_all" if include_archived else "match_requests"
+    c = conn.cursor()
+    where = f" WHERE {owner_column}=?"
+    params = [owner_id]
+    total = None
+    if limit and not cursor:
+        c.execute(f"SELECT COUNT(*) FROM {table}" + where, params)
+        total = c.fetchone()[0]
+    if cursor:
+        where += " AND id > ?"
+        params.extend(decode_cursor(cursor, 1))
+    query = f"SELECT id, {item_json} FROM {table}" + where + " ORDER BY id"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit + 1)
+    c.execute(query, params)
+    rows = c.fetchall()
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][0]])
+    if not limit:
+        total = len(rows)
+    return json_array(rows, 1), next_cursor, total
+
 # 멘토: 받은 매칭 요청 조회
 @app.get("/api/match-requests/incoming")
-def get_incoming_match_requests(user=Depends(get_current_user)):
+async def get_incoming_match_requests(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_archived: bool = False,
+    user=Depends(get_current_user),
+):
     if user["role"] != "mentor":
         raise HTTPException(status_code=401, detail="Only mentor can view incoming requests")
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT id, mentor_id, mentee_id, message, status FROM match_requests WHERE mentor_id=?", (user["user_id"],))
-    result = [
-        {"id": row[0], "mentorId": row[1], "menteeId": row[2], "message": row[3], "status": row[4]}
-        for row in c.fetchall()
-    ]
-    conn.close()
-    return result
+    check_limit(limit)
+    # 스냅샷이 아닌 app.db 에서: 이벤트 스트림은 현재 MAX(id) 부터 시작하므로 목록도 그 시점 이후여야 빈틈이 없다
+    body, next_cursor, total = await database.read(
+        list_match_requests, INCOMING_REQUEST_JSON,
+        "mentor_id", user["user_id"], limit, cursor, include_archived,
+    )
+    response = Response(content=body, media_type="application/json")
+    set_page_headers(response, next_cursor, total)
+    return response
 
 # 멘티: 보낸 매칭 요청 조회
 @app.get("/api/match-requests/outgoing")
-def get_outgoing_match_requests(user=Depends(get_current_user)):
+async def get_outgoing_match_requests(
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_archived: bool = False,
+    user=Depends(get_current_user),
+):
     if user["role"] != "mentee":
         raise HTTPException(status_code=401, detail="Only mentee can view outgoing requests")
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT id, mentor_id, mentee_id, status FROM match_requests WHERE mentee_id=?", (user["user_id"],))
-    result = [
-        {"id": row[0], "mentorId": row[1], "menteeId": row[2], "status": row[3]}
-        for row in c.fetchall()
-    ]
-    conn.close()
-    return result
+    check_limit(limit)
+    # incoming 과 같은 이유로 app.db 에서 읽는다
+    body, next_cursor, total = await database.read(
+        list_match_requests, OUTGOING_REQUEST_JSON,
+        "mentee_id", user["user_id"], limit, cursor, include_archived,
+    )
+    response = Response(content=body, media_type="application/json")
+    set_page_headers(response, next_cursor, total)
+    return response
+
+# 매칭 요청 상태 변경 스트림 (SSE)
+stream_security = HTTPBearer(auto_error=False)
+
+@app.get("/api/match-requests/events")
+async def match_request_events(
+    request: Request,
+    token: Optional[str] = None,
+    lastEventId: Optional[int] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(stream_security),
+):
+    # EventSource 는 Authorization 헤더를 보낼 수 없어서 token 쿼리 파라미터도 허용
+    raw_token = credentials.credentials if credentials else token
+    if not raw_token:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    user = await authenticate(raw_token)
+    # 재연결 시 브라우저가 보내는 Last-Event-ID 헤더가 우선
+    header = request.headers.get("last-event-id", "")
+    last_event_id = int(header) if header.isdigit() else lastEventId
+    # 새 스트림은 지금 이후 이벤트만. 응답(open) 전에 위치를 정해 두어서, 클라이언트가 open 후에 조회한 목록과 빈틈이 없다
+    if last_event_id is None:
+        last_event_id = await run_in_threadpool(latest_event_id)
+    return StreamingResponse(
+        match_event_stream(request, user["user_id"], last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 # 매칭 요청 수락/거절/취소
-@app.put("/api/match-requests/{id}/accept")
-def accept_match_request(id: int, user=Depends(get_current_user)):
-    if user["role"] != "mentor":
-        raise HTTPException(status_code=401, detail="Only mentor can accept requests")
-    conn = get_db()
+# 새 상태 → (허용되는 이전 상태, 요청할 수 있는 쪽 컬럼)
+MATCH_TRANSITIONS = {
+    "accepted": (("pending",), "mentor_id"),
+    "rejected": (("pending", "accepted"), "mentor_id"),
+    "cancelled": (("pending", "accepted"), "mentee_id"),
+}
+
+ALREADY_ACCEPTED = "You have already accepted a mentee. Cancel/delete before accepting another."
+
+def transition_match_request(conn, id: int, user_id: int, new_status: str):
+    """조건부 UPDATE 한 번으로 상태를 바꾼다. 바뀌지 않았을 때만 원인을 조회해서 에러로 변환."""
+    from_statuses, owner_column = MATCH_TRANSITIONS[new_status]
+    query = (
+        f"UPDATE match_requests SET status=?, status_changed_at=strftime('%s', 'now') WHERE id=? AND {owner_column}=?"
+        f" AND status IN ({', '.join('?' for _ in from_statuses)})"
+    )
+    params = [new_status, id, user_id, *from_statuses]
+    if new_status == "accepted":
+        # 멘토는 한 명만 수락 (ux_match_requests_mentor_accepted 와 같은 규칙)
+        query += " AND NOT EXISTS (SELECT 1 FROM match_requests WHERE mentor_id=? AND status='accepted')"
+        params.append(user_id)
     c = conn.cursor()
-    # 이미 수락한 요청이 있는지 확인
-    c.execute("SELECT id FROM match_requests WHERE mentor_id=? AND status='accepted'", (user["user_id"],))
-    if c.fetchone():
-        conn.close()
-        raise HTTPException(status_code=400, detail="You have already accepted a mentee. Cancel/delete before accepting another.")
-    c.execute("SELECT mentor_id, status FROM match_requests WHERE id=?", (id,))
-    row = c.fetchone()
-    if not row:
-        conn.close()
+    try:
+        with immediate_transaction(conn):
+            c.execute(query + " RETURNING mentor_id, mentee_id", params)
+            row = c.fetchone()
+            if row:
+                record_match_event(c, new_status, id, row[0], row[1])
+                return
+            c.execute("SELECT mentor_id, mentee_id, status FROM match_requests WHERE id=?", (id,))
+            current = c.fetchone()
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail=ALREADY_ACCEPTED)
+    if not current:
         raise HTTPException(status_code=404, detail="Match request not found")
-    if row[0] != user["user_id"]:
-        conn.close()
+    owner_id = current[1] if owner_column == "mentee_id" else current[0]
+    if owner_id != user_id:
         raise HTTPException(status_code=401, detail="Not your request")
-    c.execute("UPDATE match_requests SET status='accepted' WHERE id=?", (id,))
-    conn.commit()
-    conn.close()
+    if new_status == "accepted" and current[2] == "pending":
+        raise HTTPException(status_code=400, detail=ALREADY_ACCEPTED)
+    raise HTTPException(status_code=400, detail=f"Cannot change a {current[2]} request to {new_status}")
+
+@app.put("/api/match-requests/{id}/accept")
+async def accept_match_request(id: int, user=Depends(get_current_user)):
+    if user["role"] != "mentor":
+        raise HTTPException(status_code=401, detail="Only mentor can accept requests")
+    await database.write(transition_match_request, id, user["user_id"], "accepted")
+    replica.note_write(user["user_id"])
+    broker.notify()
     return {"result": "accepted"}
 
 @app.put("/api/match-requests/{id}/reject")
-def reject_match_request(id: int, user=Depends(get_current_user)):
+async def reject_match_request(id: int, user=Depends(get_current_user)):
     if user["role"] != "mentor":
         raise HTTPException(status_code=401, detail="Only mentor can reject requests")
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT mentor_id, status FROM match_requests WHERE id=?", (id,))
-    row = c.fetchone()
-    if not row:
-        conn.close()
-        raise HTTPException(status_code=404, detail="Match request not found")
-    if row[0] != user["user_id"]:
-        conn.close()
-        raise HTTPException(status_code=401, detail="Not your request")
-    c.execute("UPDATE match_requests SET status='rejected' WHERE id=?", (id,))
-    conn.commit()
-    conn.close()
+    await database.write(transition_match_request, id, user["user_id"], "rejected")
+    replica.note_write(user["user_id"])
+    broker.notify()
     return {"result": "rejected"}
 
 @app.delete("/api/match-requests/{id}")
-def cancel_match_request(id: int, user=Depends(get_current_user)):
+async def cancel_match_request(id: int, user=Depends(get_current_user)):
     if user["role"] != "mentee":
         raise HTTPException(status_code=401, detail="Only mentee can cancel requests")
-    conn = get_db()
-    c = conn.cursor()
-    c.execute("SELECT mentee_id, status FROM match_requests WHERE id=?", (id,))
-    row = c.fetchone()
-    if not row:
-        raise HTTPException(status_code=404, detail="Match request not found")
-    if row[0] != user["user_id"]:
-        raise HTTPException(status_code=401, detail="Not your request")
-    c.execute("UPDATE match_requests SET status='cancelled' WHERE id=?", (id,))
-    conn.commit()
-    conn.close()
+    await database.write(transition_match_request, id, user["user_id"], "cancelled")
+    replica.note_write(user["user_id"])
+    broker.notify()
     return {"result": "cancelled"}
 
+# 매칭 요청 일괄 처리 (Requests.vue 일괄 정리 등)
+MATCH_ACTIONS = {
+    "accept": ("accepted", "mentor"),
+    "reject": ("rejected", "mentor"),
+    "cancel": ("cancelled", "mentee"),
+}
+
+class MatchRequestAction(BaseModel):
+    id: int
+    action: Literal["accept", "reject", "cancel"]
+
+class MatchRequestBatch(BaseModel):
+    actions: list[MatchRequestAction]
+
+def apply_match_actions(conn, user_id: int, role: str, actions: list[MatchRequestAction]):
+    """모든 동작을 하나의 쓰기 트랜잭션에서 순서대로 검사/적용하고 (항목별 결과, 변경 여부) 를 반환한다.
+
+    대상 요청은 한 번에 조회하고, 앞선 항목의 상태 변경을 반영해서 다음 항목을 검사한다.
+    실패한 항목은 건너뛰고 나머지는 적용된다.
+    """
+    ids = sorted({a.id for a in actions})
+    c = conn.cursor()
+    results = []
+    changed = False
+    with immediate_transaction(conn):
+        c.execute(
+            f"SELECT id, mentor_id, mentee_id, status FROM match_requests WHERE id IN ({', '.join('?' for _ in ids)})",
+            ids,
+        )
+        current = {row[0]: [row[1], row[2], row[3]] for row in c.fetchall()}
+        c.execute("SELECT 1 FROM match_requests WHERE mentor_id=? AND status='accepted'", (user_id,))
+        has_accepted = role == "mentor" and c.fetchone() is not None
+        for item in actions:
+            new_status, allowed_role = MATCH_ACTIONS[item.action]
+            from_statuses, owner_column = MATCH_TRANSITIONS[new_status]
+            row = current.get(item.id)
+            if role != allowed_role:
+                error = (401, f"Only {allowed_role} can {item.action} requests")
+            elif row is None:
+                error = (404, "Match request not found")
+            elif (row[1] if owner_column == "mentee_id" else row[0]) != user_id:
+                error = (401, "Not your request")
+            elif new_status == "accepted" and has_accepted and row[2] == "pending":
+                error = (400, ALREADY_ACCEPTED)
+            elif row[2] not in from_statuses:
+                error = (400, f"Cannot change a {row[2]} request to {new_status}")
+            else:
+                error = None
+            if error:
+                results.append({"id": item.id, "action": item.action, "ok": False, "status": error[0], "error": error[1]})
+                continue
+            previous, row[2] = row[2], new_status
+            if new_status == "accepted":
+                has_accepted = True
+            elif previous == "accepted" and owner_column == "mentor_id":
+                has_accepted = False
+            c.execute(
+                "UPDATE match_requests SET status=?, status_changed_at=strftime('%s', 'now') WHERE id=?",
+                (new_status, item.id),
+            )
+            record_match_event(c, new_status, item.id, row[0], row[1])
+            changed = True
+            results.append({"id": item.id, "action": item.action, "ok": True, "status": 200, "result": new_status})
+    return results, changed
+
+@app.post("/api/match-requests/batch")
+async def batch_match_requests(data: MatchRequestBatch, user=Depends(get_current_user)):
+    if not data.actions:
+        return {"results": []}
+    if len(data.actions) > MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LIMIT} actions per batch")
+    try:
+        results, changed = await database.write(apply_match_actions, user["user_id"], user["role"], data.actions)
+    except sqlite3.IntegrityError:
+        raise HTTPException(status_code=400, detail=ALREADY_ACCEPTED)
+    if changed:
+        replica.note_write(user["user_id"])
+        broker.notify()
+    return {"results": results}
+
 # 프로필 이미지 조회
+def load_image_meta(role: str, user_id: int):
+    with connection() as conn:
+        row = conn.execute(
+            f"SELECT image_hash, image_ext FROM {PROFILE_TABLES[role]} WHERE user_id=?", (user_id,)
+        ).fetchone()
+    return (row[0], row[1]) if row and row[0] else None
+
 @app.get("/api/images/{role}/{id}")
-def get_profile_image(role: str, id: int, user=Depends(get_current_user)):
-    static_dir = os.path.join(os.path.dirname(__file__), "static")
-    for ext in ["jpg", "png"]:
-        img_path = os.path.join(static_dir, f"{role}_{id}.{ext}")
-        if os.path.exists(img_path):
-            return FileResponse(img_path, media_type=f"image/{ext}")
+def get_profile_image(
+    request: Request,
+    role: str,
+    id: int,
+    size: Optional[int] = None,
+    v: Optional[str] = None,
+    user=Depends(get_current_user),
+):
+    meta = image_meta.get_profile(role, id, load_image_meta) if role in PROFILE_TABLES else None
+    if meta:
+        digest, ext = meta
+        # size 를 주면 그 이상인 가장 작은 리사이즈본 (브라우저가 지원하면 WebP) 을 보낸다
+        path, media_type, etag = resolve_image(digest, ext, size, "image/webp" in request.headers.get("accept", ""))
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if v == digest else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept",
+        }
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return FileResponse(path, media_type=media_type, headers=headers)
     # 없으면 역할별 기본 이미지 리다이렉트
     if role == "mentor":
         return RedirectResponse("https://placehold.co/500x500.jpg?text=MENTOR")
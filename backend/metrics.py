@@ -0,0 +1,348 @@
+# 요청/SQL 지표 수집과 Prometheus 텍스트 출력 (워커 프로세스별로 집계)
+import bisect
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 이 시간보다 오래 걸린 쿼리는 EXPLAIN QUERY PLAN 과 함께 로그에 남긴다
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+# progress handler 호출 간격 (VM 명령 수). 작을수록 정확하지만 오버헤드가 크다
+VM_STEP_INTERVAL = 1000
+# 라벨 종류가 무한히 늘지 않도록 서로 다른 SQL 문 수를 제한
+MAX_STATEMENTS = 200
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in sorted(items):
+            yield self.name, _format_labels(self.labels, labels), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # 라벨 → [버킷별 개수..., +Inf 개수, 합계]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 2)
+            entry[index] += 1
+            entry[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(entry)) for labels, entry in self._values.items()]
+        for labels, entry in sorted(items):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), entry):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    _format_labels(self.labels + ("le",), labels + (bound,)),
+                    cumulative,
+                )
+            base = _format_labels(self.labels, labels)
+            yield f"{self.name}_count", base, cumulative
+            yield f"{self.name}_sum", base, entry[-1]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        # 조회 시점에 값을 읽어 오는 지표: () -> [(이름, 종류, 설명, 값)]
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        self.collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        for collect in self.collectors:
+            for name, kind, help, value in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(
+    Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+)
+HTTP_LATENCY = registry.register(
+    Histogram("http_request_duration_seconds", "Time until response headers are sent.", ("method", "route"))
+)
+HTTP_IN_FLIGHT = registry.register(
+    Gauge("http_requests_in_flight", "Requests currently being handled.", ("method",))
+)
+SQL_LATENCY = registry.register(
+    Histogram("db_query_duration_seconds", "SQL statement time including row fetches.", ("statement",))
+)
+SQL_ROWS = registry.register(
+    Counter("db_query_rows_total", "Rows returned to the application.", ("statement",))
+)
+SQL_VM_STEPS = registry.register(
+    Counter("db_query_vm_steps_total", "SQLite VM steps (x1000), a proxy for rows scanned.", ("statement",))
+)
+SQL_SLOW = registry.register(
+    Counter("db_slow_queries_total", f"Statements slower than {SLOW_QUERY_MS:g}ms.", ("statement",))
+)
+
+
+class MetricsMiddleware:
+    """라우트(경로 템플릿)별 지연 시간, 상태 코드, 처리 중인 요청 수를 기록하는 ASGI 미들웨어.
+
+    지연 시간은 응답 헤더가 나가는 시점까지라서 SSE 같은 스트리밍 응답도 연결 유지 시간이 섞이지 않는다.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        method = scope["method"]
+        start = time.perf_counter()
+        recorded = False
+
+        def record(status):
+            nonlocal recorded
+            if recorded:
+                return
+            recorded = True
+            route = scope.get("route")
+            # 매칭되지 않은 경로는 하나로 묶어서 라벨 수가 늘지 않게 한다
+            path = getattr(route, "path", None) or "unmatched"
+            HTTP_LATENCY.observe(time.perf_counter() - start, method, path)
+            HTTP_REQUESTS.inc(method, path, str(status))
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException:
+            record(500)
+            raise
+        finally:
+            HTTP_IN_FLIGHT.dec(method)
+
+
+_statement_labels = {}
+_labels_in_use = set()
+_statement_lock = threading.Lock()
+# IN (?, ?, ...) 처럼 길이만 다른 자리표시자 목록
+_PLACEHOLDER_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+
+
+def statement_label(sql):
+    # 공백을 정리한 SQL 문 자체를 라벨로 쓴다 (파라미터는 ? 로 들어오므로 값이 섞이지 않음)
+    label = _statement_labels.get(sql)
+    if label is None:
+        normalized = re.sub(r"\s+", " ", sql).strip()
+        # 자리표시자 개수마다 라벨이 갈라져서 MAX_STATEMENTS 를 다 쓰지 않도록 하나로 합친다
+        normalized = _PLACEHOLDER_LIST.sub("(?…)", normalized)
+        if len(normalized) > 160:
+            normalized = normalized[:157] + "..."
+        with _statement_lock:
+            if normalized not in _labels_in_use:
+                if len(_labels_in_use) >= MAX_STATEMENTS:
+                    return "other"
+                _labels_in_use.add(normalized)
+            label = normalized
+            # 원문 → 라벨 메모는 크기 제한 (IN 목록 길이만큼 원문이 늘어날 수 있음)
+            if len(_statement_labels) < MAX_STATEMENTS * 8:
+                _statement_labels[sql] = label
+    return label
+
+
+class ProfiledCursor(sqlite3.Cursor):
+    """실행 + 결과 fetch 시간을 합쳐서 SQL 문 단위로 기록하는 커서.
+
+    SELECT 는 execute() 가 첫 행까지만 진행하므로, 결과를 다 읽거나 다음 문을 실행할 때 기록을 마무리한다.
+    """
+
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        return self._run(sql, parameters, super().execute)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        return self._run(sql, None, super().executemany, seq_of_parameters)
+
+    def _run(self, sql, parameters, method, *args):
+        steps = self.connection._vm_steps
+        start = time.perf_counter()
+        try:
+            return method(sql, *args) if parameters is None else method(sql, parameters)
+        finally:
+            self._pending = [sql, parameters, time.perf_counter() - start, steps, 0]
+            if self.description is None:
+                self._finish()
+
+    def _timed_fetch(self, method, *args):
+        start = time.perf_counter()
+        rows = method(*args)
+        if self._pending is not None:
+            self._pending[2] += time.perf_counter() - start
+        return rows
+
+    def fetchone(self):
+        row = self._timed_fetch(super().fetchone)
+        if self._pending is not None:
+            self._pending[4] += row is not None
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed_fetch(super().fetchmany, size or self.arraysize)
+        if self._pending is not None:
+            self._pending[4] += len(rows)
+            if not rows:
+                self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed_fetch(super().fetchall)
+        if self._pending is not None:
+            self._pending[4] += len(rows)
+            self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._timed_fetch(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._pending is not None:
+            self._pending[4] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        sql, parameters, elapsed, steps, rows = pending
+        label = statement_label(sql)
+        SQL_LATENCY.observe(elapsed, label)
+        if rows:
+            SQL_ROWS.inc(label, amount=rows)
+        steps = self.connection._vm_steps - steps
+        if steps:
+            SQL_VM_STEPS.inc(label, amount=steps)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            SQL_SLOW.inc(label)
+            log_slow_query(self.connection, sql, parameters, elapsed)
+
+
+class ProfiledConnection(sqlite3.Connection):
+    # conn.execute() 도 ProfiledCursor 를 거치도록 커서 생성을 바꾼다
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._vm_steps = 0
+        self.set_progress_handler(self._count_steps, VM_STEP_INTERVAL)
+
+    def _count_steps(self):
+        self._vm_steps += 1
+        return 0
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def log_slow_query(conn, sql, parameters, elapsed):
+    plan = ""
+    if parameters is not None and re.match(r"\s*(SELECT|WITH)\b", sql, re.IGNORECASE):
+        try:
+            # 프로파일링을 거치지 않는 기본 커서로 실행
+            rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+            plan = "; ".join(row[-1] for row in rows)
+        except sqlite3.Error as e:
+            plan = f"unavailable ({e})"
+    logger.warning("Slow query (%.1fms): %s | plan: %s", elapsed * 1000, statement_label(sql), plan or "-")
+
+
+def render_metrics():
+    return registry.render()
@@ -0,0 +1,327 @@
+# DB 스키마 마이그레이션 (schema_version 테이블로 적용된 버전 관리)
+#
+# 새 변경은 함수를 추가하고 MIGRATIONS 끝에 (다음 버전, 함수) 를 붙인다.
+# 이미 배포된 마이그레이션은 수정하지 않는다.
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from db import DB_PATH
+from images import content_path, STATIC_DIR
+from search import normalize_skills
+
+logger = logging.getLogger(__name__)
+
+
+def initial_schema(c):
+    # 이전 init_db.py 로 만든 DB 에서도 그대로 통과하도록 IF NOT EXISTS 유지
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        name TEXT NOT NULL,
+        role TEXT NOT NULL CHECK(role IN ('mentor', 'mentee'))
+    )
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS mentor_profiles (
+        user_id INTEGER PRIMARY KEY,
+        bio TEXT,
+        image_url TEXT,
+        skills TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS mentee_profiles (
+        user_id INTEGER PRIMARY KEY,
+        bio TEXT,
+        image_url TEXT,
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    )
+    ''')
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS match_requests (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        mentor_id INTEGER NOT NULL,
+        mentee_id INTEGER NOT NULL,
+        message TEXT,
+        status TEXT NOT NULL CHECK(status IN ('pending', 'accepted', 'rejected', 'cancelled')),
+        FOREIGN KEY(mentor_id) REFERENCES users(id),
+        FOREIGN KEY(mentee_id) REFERENCES users(id)
+    )
+    ''')
+
+
+def revoked_tokens(c):
+    # 폐기된 토큰 (로그아웃)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS revoked_tokens (
+        jti TEXT PRIMARY KEY,
+        exp INTEGER NOT NULL
+    )
+    ''')
+
+
+def match_request_indexes(c):
+    # 매칭 요청 조회/상태 검사용 인덱스
+    c.execute('CREATE INDEX IF NOT EXISTS idx_match_requests_mentor_status ON match_requests(mentor_id, status)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_match_requests_mentee_status ON match_requests(mentee_id, status)')
+    # 상태 규칙을 DB 에서도 강제하는 부분 유니크 인덱스
+    #  - 멘티는 대기 중(pending) 요청을 하나만
+    #  - 멘토는 수락(accepted) 한 요청을 하나만
+    #  - 같은 멘토-멘티 쌍의 진행 중(pending/accepted) 요청은 하나만
+    for ddl in (
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_match_requests_mentee_pending ON match_requests(mentee_id) WHERE status = 'pending'",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_match_requests_mentor_accepted ON match_requests(mentor_id) WHERE status = 'accepted'",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_match_requests_pair_active ON match_requests(mentor_id, mentee_id) WHERE status IN ('pending', 'accepted')",
+    ):
+        try:
+            c.execute(ddl)
+        except sqlite3.IntegrityError as e:
+            # 규칙을 어긴 기존 데이터가 있으면 인덱스 없이 계속 (트랜잭션 검사로는 여전히 보호됨)
+            logger.warning("Skipped unique index, existing rows violate it: %s", e)
+
+
+def match_events(c):
+    # 매칭 요청 상태 변경 이벤트 (SSE 스트림, Last-Event-ID 재개용)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS match_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        request_id INTEGER NOT NULL,
+        mentor_id INTEGER NOT NULL,
+        mentee_id INTEGER NOT NULL,
+        type TEXT NOT NULL CHECK(type IN ('created', 'accepted', 'rejected', 'cancelled')),
+        created_at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+    )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_match_events_mentor ON match_events(mentor_id, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_match_events_mentee ON match_events(mentee_id, id)')
+
+
+def mentor_search_index(c):
+    # 멘토 스킬 (정규화) - skill_key 는 소문자 검색 키
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS mentor_skills (
+        user_id INTEGER NOT NULL,
+        skill TEXT NOT NULL,
+        skill_key TEXT NOT NULL,
+        PRIMARY KEY(user_id, skill_key),
+        FOREIGN KEY(user_id) REFERENCES users(id)
+    ) WITHOUT ROWID
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_mentor_skills_key ON mentor_skills(skill_key, user_id)')
+    # 멘토 전문 검색 인덱스 (rowid = users.id)
+    c.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS mentor_search USING fts5(
+        name, bio, skills,
+        tokenize='unicode61'
+    )
+    ''')
+    # 기존 mentor_profiles.skills 데이터를 인덱스로 옮김 (인덱스가 비어 있을 때만)
+    if c.execute('SELECT 1 FROM mentor_search LIMIT 1').fetchone():
+        return
+    rows = c.execute(
+        "SELECT u.id, u.name, p.bio, p.skills FROM users u JOIN mentor_profiles p ON u.id = p.user_id"
+    ).fetchall()
+    # 이후 마이그레이션에서 컬럼이 늘어도 이 단계의 스키마대로 넣는다 (search.sync_mentor_index 를 쓰지 않음)
+    for user_id, name, bio, skills in rows:
+        items = normalize_skills((skills or '').split(','))
+        c.executemany(
+            'INSERT OR IGNORE INTO mentor_skills (user_id, skill, skill_key) VALUES (?, ?, ?)',
+            [(user_id, s, s.lower()) for s in items]
+        )
+        c.execute(
+            'INSERT INTO mentor_search (rowid, name, bio, skills) VALUES (?, ?, ?, ?)',
+            (user_id, name or '', bio or '', ' '.join(items))
+        )
+
+
+def profile_image_hash(c):
+    # 프로필 이미지 내용 해시 (static/<해시 앞 2자리>/<해시>.<확장자> 에 저장)
+    for table in ('mentor_profiles', 'mentee_profiles'):
+        columns = [row[1] for row in c.execute(f'PRAGMA table_info({table})')]
+        if 'image_hash' not in columns:
+            c.execute(f'ALTER TABLE {table} ADD COLUMN image_hash TEXT')
+            c.execute(f'ALTER TABLE {table} ADD COLUMN image_ext TEXT')
+    # 예전 방식({role}_{id}.jpg/png) 으로 저장된 이미지를 해시 저장소로 복사하고,
+    # 원본은 커밋 후에 지운다 (롤백되면 다음 시도에서 다시 복사)
+    migrated = []
+    for role, table in (('mentor', 'mentor_profiles'), ('mentee', 'mentee_profiles')):
+        rows = c.execute(f"SELECT user_id FROM {table} WHERE image_hash IS NULL AND image_url != ''").fetchall()
+        for (user_id,) in rows:
+            for ext in ('jpg', 'png'):
+                legacy = os.path.join(STATIC_DIR, f'{role}_{user_id}.{ext}')
+                if not os.path.exists(legacy):
+                    continue
+                with open(legacy, 'rb') as f:
+                    digest = hashlib.sha256(f.read()).hexdigest()
+                target = content_path(digest, ext)
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.copyfile(legacy, target + '.tmp')
+                    os.replace(target + '.tmp', target)
+                migrated.append(legacy)
+                c.execute(
+                    f'UPDATE {table} SET image_hash=?, image_ext=?, image_url=? WHERE user_id=?',
+                    (digest, ext, f'/api/images/{role}/{user_id}?v={digest}', user_id)
+                )
+                break
+
+    def remove_legacy_files():
+        for path in migrated:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    return remove_legacy_files
+
+
+def mentor_skill_positions(c):
+    # 스킬 입력 순서 (목록 응답의 skills 배열을 SQL 에서 바로 만들 때 순서 유지용)
+    columns = [row[1] for row in c.execute('PRAGMA table_info(mentor_skills)')]
+    if 'position' not in columns:
+        c.execute('ALTER TABLE mentor_skills ADD COLUMN position INTEGER NOT NULL DEFAULT 0')
+    rows = c.execute("SELECT user_id, skills FROM mentor_profiles WHERE skills != ''").fetchall()
+    for user_id, skills in rows:
+        c.executemany(
+            'UPDATE mentor_skills SET position=? WHERE user_id=? AND skill_key=?',
+            [(i, user_id, s.lower()) for i, s in enumerate(normalize_skills(skills.split(',')))]
+        )
+
+
+def match_request_archive(c):
+    # 상태가 마지막으로 바뀐 시각 (보관 대상 판단용). 기존 요청은 마지막 이벤트 시각으로 채운다
+    columns = [row[1] for row in c.execute('PRAGMA table_info(match_requests)')]
+    if 'status_changed_at' not in columns:
+        c.execute('ALTER TABLE match_requests ADD COLUMN status_changed_at INTEGER')
+    c.execute('''
+    UPDATE match_requests SET status_changed_at = e.at
+    FROM (SELECT request_id, MAX(created_at) AS at FROM match_events GROUP BY request_id) e
+    WHERE e.request_id = match_requests.id AND match_requests.status_changed_at IS NULL
+    ''')
+    c.execute("UPDATE match_requests SET status_changed_at = strftime('%s', 'now') WHERE status_changed_at IS NULL")
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_match_requests_terminal ON match_requests(status_changed_at) "
+        "WHERE status IN ('rejected', 'cancelled')"
+    )
+    # 오래된 거절/취소 요청 보관 테이블 (id 는 원래 요청 id 그대로)
+    c.execute('''
+    CREATE TABLE IF NOT EXISTS match_requests_archive (
+        id INTEGER PRIMARY KEY,
+        mentor_id INTEGER NOT NULL,
+        mentee_id INTEGER NOT NULL,
+        message TEXT,
+        status TEXT NOT NULL CHECK(status IN ('rejected', 'cancelled')),
+        status_changed_at INTEGER,
+        archived_at INTEGER NOT NULL
+    )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_match_requests_archive_mentor ON match_requests_archive(mentor_id, id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_match_requests_archive_mentee ON match_requests_archive(mentee_id, id)')
+    # 보관된 것까지 포함한 전체 요청 (include_archived 목록, 추천 통계, 이벤트 재전송)
+    c.execute('''
+    CREATE VIEW IF NOT EXISTS match_requests_all AS
+    SELECT id, mentor_id, mentee_id, message, status, status_changed_at FROM match_requests
+    UNION ALL
+    SELECT id, mentor_id, mentee_id, message, status, status_changed_at FROM match_requests_archive
+    ''')
+
+
+def profile_version(c):
+    # 프로필(이름/소개/이미지/스킬) 이 바뀔 때마다 올리는 버전 (/api/me, 멘토 프로필 ETag)
+    columns = [row[1] for row in c.execute('PRAGMA table_info(users)')]
+    if 'profile_version' not in columns:
+        c.execute('ALTER TABLE users ADD COLUMN profile_version INTEGER NOT NULL DEFAULT 1')
+    # 역할별 프로필 테이블을 합친 사용자 프로필 (한 번의 조회로 프로필 응답)
+    c.execute('''
+    CREATE VIEW IF NOT EXISTS user_profiles AS
+    SELECT u.id, u.email, u.name, u.role, u.profile_version,
+           COALESCE(mp.bio, me.bio, '') AS bio,
+           COALESCE(mp.image_url, me.image_url, '') AS image_url,
+           COALESCE(mp.skills, '') AS skills
+    FROM users u
+    LEFT JOIN mentor_profiles mp ON u.role = 'mentor' AND mp.user_id = u.id
+    LEFT JOIN mentee_profiles me ON u.role = 'mentee' AND me.user_id = u.id
+    ''')
+
+
+MIGRATIONS = [
+    (1, initial_schema),
+    (2, revoked_tokens),
+    (3, match_request_indexes),
+    (4, match_events),
+    (5, mentor_search_index),
+    (6, profile_image_hash),
+    (7, mentor_skill_positions),
+    (8, match_request_archive),
+    (9, profile_version),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_version'"
+    ).fetchone()
+    if not exists:
+        return 0
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(path=DB_PATH):
+    """path 의 DB 를 최신 버전으로 올리고 적용 후 버전을 반환한다.
+
+    이미 최신이면 버전 조회 한 번으로 끝난다. 적용할 것이 있으면 BEGIN IMMEDIATE 로
+    쓰기 락을 잡고 버전을 다시 확인하므로, 여러 워커가 동시에 시작해도 한 번만 적용된다.
+    DDL 도 트랜잭션에 포함되므로 중간에 실패하면 전체가 롤백된다.
+    파일 정리처럼 되돌릴 수 없는 작업은 마이그레이션이 함수로 반환하고 커밋 후에 실행한다.
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        if not conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+            # 새 DB 는 처음부터 incremental auto_vacuum (기존 DB 는 archive.py --vacuum 으로 전환)
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        version = current_version(conn)
+        if version >= LATEST_VERSION:
+            return version
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS schema_version ("
+                "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at INTEGER NOT NULL)"
+            )
+            version = current_version(conn)
+            c = conn.cursor()
+            after_commit = []
+            for number, migration in MIGRATIONS:
+                if number <= version:
+                    continue
+                logger.info("Applying migration %d %s", number, migration.__name__)
+                cleanup = migration(c)
+                if cleanup:
+                    after_commit.append(cleanup)
+                c.execute(
+                    "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                    (number, migration.__name__, int(time.time())),
+                )
+                version = number
+            conn.execute("COMMIT")
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        for cleanup in after_commit:
+            cleanup()
+        return version
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(f"Schema version {migrate()}")
@@ -0,0 +1,47 @@
+# 키셋(커서) 페이지네이션 유틸
+import base64
+import json
+from fastapi import HTTPException
+
+MAX_LIMIT = 100
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def encode_cursor(values):
+    # 마지막 행의 정렬 키 목록을 불투명한 문자열로 변환
+    raw = json.dumps(values, separators=(",", ":"), ensure_ascii=False).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor, size):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # 마지막 값은 id (정수), 그 앞은 정렬 키. 타입이 다르면 SQLite 비교 결과가 엉뚱해진다
+    *keys, last_id = values
+    if not _is_int(last_id) or not all(isinstance(k, str) or _is_int(k) for k in keys):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def check_limit(limit):
+    if limit is not None and not 1 <= limit <= MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_LIMIT}")
+    return limit
+
+
+def set_page_headers(response, next_cursor, total=None):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    if total is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(total)
@@ -0,0 +1,97 @@
+# 비밀번호 해시/검증 전용 워커 풀
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from passlib.hash import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 실행 중 + 대기 중인 작업 수 상한. 넘으면 HasherBusy (429)
+HASH_QUEUE_LIMIT = int(os.environ.get("PASSWORD_HASH_QUEUE_LIMIT", "32"))
+
+
+class HasherBusy(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Too many password operations in progress")
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """bcrypt 작업을 이벤트 루프와 기본 스레드풀 밖에서 처리한다.
+
+    bcrypt 는 해시 계산 중 GIL 을 놓기 때문에 스레드 워커로 충분하다.
+    큐가 가득 차면 기다리지 않고 바로 HasherBusy 를 던져서
+    인증 요청이 몰려도 다른 엔드포인트가 밀리지 않게 한다.
+    """
+
+    def __init__(self, rounds=BCRYPT_ROUNDS, workers=HASH_WORKERS, queue_limit=HASH_QUEUE_LIMIT):
+        self.rounds = rounds
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._hasher = bcrypt.using(rounds=rounds)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pwhash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._avg_seconds = 0.1  # 작업당 평균 소요 시간 (EWMA)
+        self._dummy_hash = None
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def retry_after(self):
+        # 현재 큐를 비우는 데 걸릴 예상 시간 (초, 최소 1)
+        return max(1, round(self._pending * self._avg_seconds / self.workers))
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self._avg_seconds = self._avg_seconds * 0.8 + elapsed * 0.2
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.queue_limit:
+                raise HasherBusy(self.retry_after())
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._timed, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _verify(self, password, hashed):
+        ok = self._hasher.verify(password, hashed)
+        # 비용 설정이 바뀌었으면 로그인 성공 시 새 비용으로 재해시
+        if ok and self._hasher.needs_update(hashed):
+            return True, self._hasher.hash(password)
+        return ok, None
+
+    def _verify_dummy(self, password):
+        # 없는 사용자도 같은 비용의 검증을 거쳐서 응답 시간으로 가입 여부가 드러나지 않게 한다
+        if self._dummy_hash is None:
+            self._dummy_hash = self._hasher.hash(os.urandom(16).hex())
+        self._hasher.verify(password, self._dummy_hash)
+        return False, None
+
+    async def hash(self, password):
+        return await self._submit(self._hasher.hash, password)
+
+    async def verify(self, password, hashed):
+        """(일치 여부, 재해시된 값 또는 None) 을 반환한다."""
+        return await self._submit(self._verify, password, hashed)
+
+    async def verify_unknown(self, password):
+        """없는 사용자용. 항상 (False, None) 이지만 verify 와 같은 시간이 걸린다."""
+        return await self._submit(self._verify_dummy, password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+password_hasher = PasswordHasher()
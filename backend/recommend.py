@@ -0,0 +1,214 @@
+# 멘티별 멘토 추천 (스킬/소개 TF-IDF 역색인 + 수락 이력)
+import math
+import os
+import re
+import threading
+import time
+import numpy as np
+
+# 다른 워커의 프로필 수정과 수락 이력은 이 주기로 전체 재구성해서 반영
+INDEX_TTL = float(os.environ.get("RECOMMEND_INDEX_TTL", "300"))
+
+SKILL_WEIGHT = 1.0
+BIO_WEIGHT = 0.5
+# 멘티가 이전에 요청했던 멘토의 스킬을 관심사로 반영하는 비율
+HISTORY_WEIGHT = 0.5
+# 수락률(사전 분포로 보정) 가산점 비율. 유사도(0~1) 에 더해진다
+PRIOR_WEIGHT = 0.2
+
+_TOKEN = re.compile(r"[0-9a-z가-힣][0-9a-z가-힣+#.]*")
+
+
+def tokenize(text):
+    # c++, c#, node.js 같은 스킬 이름이 깨지지 않도록 + # . 은 토큰에 포함 (끝의 . 은 제거)
+    tokens = []
+    for token in _TOKEN.findall((text or "").lower()):
+        token = token.rstrip(".")
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+def mentor_terms(skills, bio):
+    """멘토 문서 벡터 (term → 가중치, L2 정규화). 스킬과 소개를 같은 토큰 규칙으로 나눈다."""
+    terms = {}
+    for skill in skills:
+        for token in tokenize(skill):
+            terms[token] = max(terms.get(token, 0.0), SKILL_WEIGHT)
+    for token in tokenize(bio):
+        terms[token] = terms.get(token, 0.0) + BIO_WEIGHT
+    norm = math.sqrt(sum(w * w for w in terms.values()))
+    return {t: w / norm for t, w in terms.items()} if norm else {}
+
+
+def acceptance_prior(accepted, rejected):
+    # 수락 / (수락 + 거절) 을 베타(1, 1) 사전 분포로 보정 → 이력이 없으면 0.5
+    return (accepted + 1.0) / (accepted + rejected + 2.0)
+
+
+class MentorIndex:
+    """멘토 스킬/소개 역색인. term → (행 번호 배열, 가중치 배열) 을 numpy 로 들고 있다.
+
+    문서 쪽은 tf 를 L2 정규화, 질의 쪽에 idf 를 곱하는 방식(lnc.ltc)이라 멘토 한 명이
+    바뀌어도 그 멘토의 posting 과 df 만 갱신하면 된다. 행 번호는 재사용하지 않고
+    삭제/수정된 이전 항목은 posting 에서 빼낸다.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reset()
+        self.built_at = None
+
+    def _reset(self):
+        self._rows = {}  # mentor_id → 행
+        self._ids = []  # 행 → mentor_id
+        self._terms = {}  # mentor_id → {term: 가중치}
+        self._postings = {}  # term → {행: 가중치}
+        self._compiled = {}  # term → (행 배열, 가중치 배열)
+        self._prior = []
+        self._arrays = None  # (ids 배열, prior 배열, 스킬/소개가 있는 멘토 수)
+
+    def build(self, mentors, stats):
+        """mentors: (id, skills 문자열, bio), stats: id → (수락 수, 거절 수)"""
+        # 새 색인은 락 밖에서 만들고 교체만 락 안에서 (재구성 중에도 이전 색인으로 조회 가능)
+        fresh = MentorIndex()
+        for mentor_id, skills, bio in mentors:
+            fresh._set(mentor_id, (skills or "").split(","), bio, stats.get(mentor_id, (0, 0)))
+        with self._lock:
+            for name in ("_rows", "_ids", "_terms", "_postings", "_compiled", "_prior", "_arrays"):
+                setattr(self, name, getattr(fresh, name))
+            self.built_at = time.monotonic()
+
+    def is_stale(self):
+        return self.built_at is None or time.monotonic() - self.built_at > INDEX_TTL
+
+    def update_mentor(self, mentor_id, skills, bio):
+        # 프로필 수정 시 해당 멘토의 posting 만 교체 (수락 이력은 유지)
+        with self._lock:
+            if self.built_at is None:
+                return
+            row = self._rows.get(mentor_id)
+            prior = self._prior[row] if row is not None else acceptance_prior(0, 0)
+            self._set(mentor_id, skills, bio, prior=prior)
+
+    def _set(self, mentor_id, skills, bio, stats=(0, 0), prior=None):
+        old = self._terms.get(mentor_id, {})
+        row = self._rows.get(mentor_id)
+        if row is None:
+            row = self._rows[mentor_id] = len(self._ids)
+            self._ids.append(mentor_id)
+            self._prior.append(0.0)
+            self._arrays = None
+        terms = mentor_terms(skills, bio)
+        for term in old:
+            self._postings[term].pop(row, None)
+            self._compiled.pop(term, None)
+        for term, weight in terms.items():
+            self._postings.setdefault(term, {})[row] = weight
+            self._compiled.pop(term, None)
+        self._terms[mentor_id] = terms
+        self._prior[row] = acceptance_prior(*stats) if prior is None else prior
+        self._arrays = None
+
+    def _posting(self, term):
+        compiled = self._compiled.get(term)
+        if compiled is None:
+            posting = self._postings.get(term)
+            if not posting:
+                return None
+            compiled = (
+                np.fromiter(posting.keys(), dtype=np.int64, count=len(posting)),
+                np.fromiter(posting.values(), dtype=np.float32, count=len(posting)),
+            )
+            self._compiled[term] = compiled
+        return compiled
+
+    def query_terms(self, bio, history):
+        """멘티 질의 벡터: 소개 토큰 + 이전에 요청한 멘토들의 스킬/소개 (HISTORY_WEIGHT 배)."""
+        query = {}
+        for token in tokenize(bio):
+            query[token] = query.get(token, 0.0) + 1.0
+        with self._lock:
+            for mentor_id in history:
+                for term, weight in self._terms.get(mentor_id, {}).items():
+                    query[term] = query.get(term, 0.0) + HISTORY_WEIGHT * weight
+        return query
+
+    def recommend(self, query, k, exclude=()):
+        """(mentor_id, 점수) 를 점수 내림차순으로 최대 k 개 반환. 질의가 비면 수락률 순."""
+        with self._lock:
+            if self._arrays is None:
+                self._arrays = (
+                    np.array(self._ids, dtype=np.int64),
+                    np.array(self._prior, dtype=np.float32),
+                    sum(1 for t in self._terms.values() if t) or 1,
+                )
+            ids, prior, live = self._arrays
+            n = len(ids)
+            if not n or k <= 0:
+                return []
+            scores = np.zeros(n, dtype=np.float32)
+            norm = 0.0
+            for term, weight in query.items():
+                posting = self._posting(term)
+                if posting is None:
+                    continue
+                rows, weights = posting
+                idf = math.log((1 + live) / (1 + len(rows))) + 1.0
+                q = weight * idf
+                norm += q * q
+                # 한 term 의 posting 에는 같은 행이 한 번만 있으므로 fancy index += 가 안전하다
+                scores[rows] += q * weights
+            excluded = [self._rows[m] for m in exclude if m in self._rows]
+        if norm:
+            scores /= math.sqrt(norm)
+        scores += PRIOR_WEIGHT * prior
+        if excluded:
+            scores[excluded] = -np.inf
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        # 점수 내림차순, 동점은 id 오름차순
+        top = top[np.lexsort((ids[top], -scores[top]))]
+        return [(int(ids[i]), round(float(scores[i]), 4)) for i in top if np.isfinite(scores[i])]
+
+
+mentor_index = MentorIndex()
+_build_lock = threading.Lock()
+
+
+def load_mentor_index(conn):
+    mentors = conn.execute(
+        "SELECT u.id, p.skills, p.bio FROM users u JOIN mentor_profiles p ON u.id = p.user_id"
+    ).fetchall()
+    stats = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute(
+            "SELECT mentor_id, SUM(status = 'accepted'), SUM(status = 'rejected') FROM match_requests_all "
+            "WHERE status IN ('accepted', 'rejected') GROUP BY mentor_id"
+        )
+    }
+    mentor_index.build(mentors, stats)
+
+
+def recommend_for_mentee(conn, mentee_id, k):
+    """멘티의 소개와 요청 이력으로 추천 멘토 (id, 점수) 목록을 만든다. 리더 스레드에서 호출."""
+    if mentor_index.is_stale():
+        # 처음에는 기다려서 만들고, 이후 재구성은 한 스레드만 하고 나머지는 이전 색인을 쓴다
+        if mentor_index.built_at is None:
+            with _build_lock:
+                if mentor_index.built_at is None:
+                    load_mentor_index(conn)
+        elif _build_lock.acquire(blocking=False):
+            try:
+                load_mentor_index(conn)
+            finally:
+                _build_lock.release()
+    row = conn.execute("SELECT bio FROM mentee_profiles WHERE user_id=?", (mentee_id,)).fetchone()
+    history = conn.execute(
+        "SELECT mentor_id, status FROM match_requests_all WHERE mentee_id=?", (mentee_id,)
+    ).fetchall()
+    # 거절당한 멘토는 관심사로 치지 않고, 진행 중인 요청이 있는 멘토는 추천에서 제외
+    interests = [m for m, status in history if status != "rejected"]
+    active = [m for m, status in history if status in ("pending", "accepted")]
+    query = mentor_index.query_terms(row[0] if row else "", interests)
+    return mentor_index.recommend(query, k, exclude=active)
@@ -0,0 +1,145 @@
+# 읽기 전용 스냅샷 (app.db 를 backup API 로 주기적으로 복사해서 읽기 엔드포인트를 분산)
+import asyncio
+import glob
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from db import database
+
+logger = logging.getLogger(__name__)
+
+# off: 모든 읽기를 app.db 에서, snapshot: 읽기 엔드포인트는 워커별 스냅샷 파일에서
+READ_REPLICA = os.environ.get("READ_REPLICA", "off")
+# 이보다 오래된 스냅샷은 쓰지 않고 app.db 에서 읽는다. 갱신은 이 절반 주기로
+MAX_STALENESS = float(os.environ.get("READ_REPLICA_MAX_STALENESS", "5"))
+_default_dir = "/dev/shm" if os.path.isdir("/dev/shm") else os.path.dirname(os.path.abspath(__file__))
+REPLICA_DIR = os.environ.get("READ_REPLICA_DIR", _default_dir)
+# read-your-writes 용으로 기억하는 세션(사용자) 수
+SESSION_SIZE = 100000
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Snapshot:
+    def __init__(self, path, taken_at):
+        self.path = path
+        self.taken_at = taken_at
+
+
+class SnapshotReplica:
+    """워커마다 app.db 의 스냅샷 파일을 만들어 두고 읽기 전용(immutable) 으로 연다.
+
+    스냅샷은 복사를 시작한 시각(taken_at) 이전에 커밋된 내용을 모두 담는다.
+    current() 는 max_staleness 안이면서 그 세션의 마지막 쓰기 이후에 찍힌 스냅샷만 돌려주고,
+    없으면 None (app.db 에서 읽기) 이라서 방금 쓴 사용자는 항상 자기 변경을 본다.
+    세션별 쓰기 시각은 워커 안에서만 기억하므로 다른 워커로 간 요청은 최대 max_staleness 만큼 늦을 수 있다.
+    """
+
+    def __init__(self, path=None, enabled=READ_REPLICA == "snapshot", max_staleness=MAX_STALENESS, directory=REPLICA_DIR):
+        # None 이면 앱이 쓰는 DB (db.use_database 로 바뀐 경우 포함)
+        self.path = path
+        self.enabled = enabled
+        self.max_staleness = max_staleness
+        self.directory = directory
+        self._snapshot = None
+        # 직전 스냅샷: current() 로 받아 간 요청이 아직 읽을 수 있도록 다음 교체 때까지 파일을 남긴다
+        self._previous = None
+        self._generation = 0
+        self._writes = OrderedDict()
+        self._lock = threading.Lock()
+        self.refreshes = 0
+
+    @property
+    def source(self):
+        return self.path or database.path
+
+    def _snapshot_path(self, generation):
+        name = os.path.splitext(os.path.basename(self.source))[0]
+        return os.path.join(self.directory, f"{name}-snapshot-{os.getpid()}-{generation}.db")
+
+    def refresh(self):
+        """새 스냅샷 파일을 만들고 교체한다. 두 세대 전 파일을 지운다 (열려 있는 커넥션은 계속 읽을 수 있다)."""
+        with self._lock:
+            self._generation += 1
+            target = self._snapshot_path(self._generation)
+        # 복사 시작 전 시각: 이 시각까지 커밋된 쓰기는 스냅샷에 들어 있다
+        taken_at = time.time()
+        source = sqlite3.connect(self.source)
+        dest = sqlite3.connect(target)
+        try:
+            source.backup(dest)
+            # immutable 로 열 수 있도록 WAL 표시를 지운다
+            dest.execute("PRAGMA journal_mode=DELETE")
+        except BaseException:
+            dest.close()
+            if os.path.exists(target):
+                os.remove(target)
+            raise
+        finally:
+            source.close()
+        dest.close()
+        with self._lock:
+            expired = self._previous
+            self._previous, self._snapshot = self._snapshot, Snapshot(target, taken_at)
+            self.refreshes += 1
+        if expired:
+            os.remove(expired.path)
+
+    def note_write(self, session):
+        # 쓰기가 커밋된 뒤에 호출 → 이 시각 이후에 찍힌 스냅샷만 이 세션에 쓴다
+        with self._lock:
+            self._writes[session] = time.time()
+            self._writes.move_to_end(session)
+            while len(self._writes) > SESSION_SIZE:
+                self._writes.popitem(last=False)
+
+    def current(self, session=None):
+        if not self.enabled:
+            return None
+        with self._lock:
+            snapshot = self._snapshot
+            last_write = self._writes.get(session, 0.0)
+        if snapshot is None or snapshot.taken_at <= last_write:
+            return None
+        if time.time() - snapshot.taken_at > self.max_staleness:
+            return None
+        return snapshot
+
+    async def refresh_loop(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception:
+                # 갱신이 밀리면 current() 가 None 이 되어 app.db 로 읽는다
+                logger.exception("Snapshot refresh failed")
+            await asyncio.sleep(self.max_staleness / 2)
+
+    def close(self):
+        with self._lock:
+            snapshots = (self._previous, self._snapshot)
+            self._previous = self._snapshot = None
+        for snapshot in snapshots:
+            if snapshot:
+                os.remove(snapshot.path)
+
+    def remove_stale_files(self):
+        # 비정상 종료한 워커가 남긴 스냅샷 정리 (살아 있는 pid 의 파일은 그대로)
+        name = os.path.splitext(os.path.basename(self.source))[0]
+        for path in glob.glob(os.path.join(self.directory, f"{name}-snapshot-*-*.db")):
+            pid = path.rsplit("-", 2)[-2]
+            if pid.isdigit() and not _alive(int(pid)):
+                os.remove(path)
+
+
+replica = SnapshotReplica()
@@ -0,0 +1,59 @@
+# 멘토 검색 인덱스 (정규화된 스킬 테이블 + FTS5)
+import re
+
+
+def normalize_skills(skills):
+    # 공백 제거, 빈 값/대소문자만 다른 중복 제거 (입력 순서 유지)
+    result = []
+    seen = set()
+    for s in skills or []:
+        s = s.strip()
+        key = s.lower()
+        if s and key not in seen:
+            seen.add(key)
+            result.append(s)
+    return result
+
+
+def sync_mentor_index(c, user_id, name, bio, skills):
+    """mentor_skills 와 mentor_search 를 프로필 내용에 맞춰 갱신한다.
+
+    호출하는 쪽의 트랜잭션 안에서 실행되며 커밋은 하지 않는다.
+    """
+    c.execute("DELETE FROM mentor_skills WHERE user_id=?", (user_id,))
+    c.executemany(
+        "INSERT INTO mentor_skills (user_id, skill, skill_key, position) VALUES (?, ?, ?, ?)",
+        [(user_id, s, s.lower(), i) for i, s in enumerate(skills)],
+    )
+    c.execute("DELETE FROM mentor_search WHERE rowid=?", (user_id,))
+    c.execute(
+        "INSERT INTO mentor_search (rowid, name, bio, skills) VALUES (?, ?, ?, ?)",
+        (user_id, name or "", bio or "", " ".join(skills)),
+    )
+
+
+def skill_filter(skill):
+    """skill 파라미터를 (SQL 조건, 파라미터) 로 변환한다.
+
+    기본은 대소문자 무시 정확히 일치, 끝에 '*' 를 붙이면 접두어 검색.
+    둘 다 mentor_skills(skill_key) 인덱스 범위 검색으로 처리된다.
+    """
+    key = skill.strip().lower()
+    if key.endswith("*"):
+        prefix = key.rstrip("*")
+        return (
+            "u.id IN (SELECT user_id FROM mentor_skills WHERE skill_key >= ? AND skill_key < ?)",
+            [prefix, prefix + "\U0010ffff"],
+        )
+    return "u.id IN (SELECT user_id FROM mentor_skills WHERE skill_key = ?)", [key]
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def fts_query(text):
+    # 사용자 입력을 FTS5 문법으로 안전하게 변환 (각 단어 접두어 AND 검색)
+    tokens = _TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    return " ".join(f'"{t}"*' for t in tokens)
@@ -1,17 +1,15 @@
 import pytest
-from fastapi.testclient import TestClient
-from main import app
 
-client = TestClient(app)
+# client, fresh_db, make_* 픽스처는 conftest.py
 
-def test_health():
+def test_health(client):
     response = client.get("/api/health")
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
 
 # 회원가입/로그인/내 정보 테스트
 
-def test_signup():
+def test_signup(client):
     data = {
         "email": "testuser1@example.com",
         "password": "testpass1",
@@ -19,93 +17,601 @@ def test_signup():
         "role": "mentee"
     }
     r = client.post("/api/signup", json=data)
-    assert r.status_code in (201, 400)
+    assert r.status_code == 201
+    assert client.post("/api/signup", json=data).status_code == 400
 
-def test_login():
-    data = {"email": "testuser1@example.com", "password": "testpass1"}
+def test_login(client, make_mentee):
+    mentee = make_mentee()
+    data = {"email": mentee.email, "password": mentee.password}
     r = client.post("/api/login", json=data)
     assert r.status_code == 200
     assert "token" in r.json()
-    return r.json()["token"]
+    assert client.post("/api/login", json=dict(data, password="wrong")).status_code == 401
 
-def test_me():
-    token = test_login()
-    headers = {"Authorization": f"Bearer {token}"}
-    r = client.get("/api/me", headers=headers)
+def test_me(client, make_mentee):
+    mentee = make_mentee()
+    r = client.get("/api/me", headers=mentee.headers)
     assert r.status_code == 200
-    assert "email" in r.json()
-    assert "role" in r.json()
+    assert r.json()["email"] == mentee.email
+    assert r.json()["role"] == "mentee"
 
-def test_update_profile():
-    token = test_login()
-    headers = {"Authorization": f"Bearer {token}"}
+def test_update_profile(client, make_mentee):
+    mentee = make_mentee()
     data = {
-        "id": 1,
+        "id": mentee.id,
         "name": "테스트유저1수정",
         "role": "mentee",
         "bio": "수정된 소개",
         "image": "",
     }
-    r = client.put("/api/profile", json=data, headers=headers)
-    assert r.status_code in (200, 400)
-
-def test_mentors_list():
-    # 멘토 계정 생성 및 로그인
-    mentor_signup = {
-        "email": "mentor1@example.com",
-        "password": "mentorpass1",
-        "name": "멘토1",
-        "role": "mentor"
-    }
-    client.post("/api/signup", json=mentor_signup)
-    mentor_login = {"email": "mentor1@example.com", "password": "mentorpass1"}
-    mentor_token = client.post("/api/login", json=mentor_login).json()["token"]
-    # 멘티 로그인
-    mentee_token = test_login()
-    mentee_headers = {"Authorization": f"Bearer {mentee_token}"}
-    r = client.get("/api/mentors", headers=mentee_headers)
+    r = client.put("/api/profile", json=data, headers=mentee.headers)
     assert r.status_code == 200
-    assert isinstance(r.json(), list)
-
-def test_match_request_flow():
-    # 멘토 계정 생성 및 로그인
-    mentor_signup = {
-        "email": "mentor2@example.com",
-        "password": "mentorpass2",
-        "name": "멘토2",
-        "role": "mentor"
-    }
-    client.post("/api/signup", json=mentor_signup)
-    mentor_login = {"email": "mentor2@example.com", "password": "mentorpass2"}
-    mentor_token = client.post("/api/login", json=mentor_login).json()["token"]
-    mentor_headers = {"Authorization": f"Bearer {mentor_token}"}
-    # 멘티 로그인
-    mentee_token = test_login()
-    mentee_headers = {"Authorization": f"Bearer {mentee_token}"}
-    # 멘토 id 찾기
-    mentors = client.get("/api/mentors", headers=mentee_headers).json()
-    mentor_id = [m["id"] for m in mentors if m["email"] == "mentor2@example.com"]
-    if not mentor_id:
-        pytest.skip("멘토2 없음")
-    mentor_id = mentor_id[0]
-    # 매칭 요청 생성
-    req = {
-        "mentorId": mentor_id,
-        "menteeId": 1,
-        "message": "멘토링 요청합니다"
-    }
-    r = client.post("/api/match-requests", json=req, headers=mentee_headers)
+    assert client.get("/api/me", headers=mentee.headers).json()["profile"]["bio"] == "수정된 소개"
+
+def test_mentors_list(client, make_mentor, make_mentee):
+    mentor = make_mentor()
+    mentee = make_mentee()
+    r = client.get("/api/mentors", headers=mentee.headers)
     assert r.status_code == 200
-    match_id = r.json()["id"]
+    assert [m["id"] for m in r.json()] == [mentor.id]
+
+def test_match_request_flow(client, make_mentor, make_mentee, make_request):
+    mentor = make_mentor()
+    mentee = make_mentee()
+    match_id = make_request(mentee, mentor)
     # 멘토가 받은 요청 확인
-    r = client.get("/api/match-requests/incoming", headers=mentor_headers)
+    r = client.get("/api/match-requests/incoming", headers=mentor.headers)
     assert r.status_code == 200
+    assert [x["id"] for x in r.json()] == [match_id]
     # 멘티가 보낸 요청 확인
-    r = client.get("/api/match-requests/outgoing", headers=mentee_headers)
+    r = client.get("/api/match-requests/outgoing", headers=mentee.headers)
     assert r.status_code == 200
+    assert [x["status"] for x in r.json()] == ["pending"]
     # 멘토가 요청 수락
-    r = client.put(f"/api/match-requests/{match_id}/accept", headers=mentor_headers)
+    r = client.put(f"/api/match-requests/{match_id}/accept", headers=mentor.headers)
     assert r.status_code == 200
     # 멘티가 요청 취소
-    r = client.delete(f"/api/match-requests/{match_id}", headers=mentee_headers)
-    assert r.status_code in (200, 400, 404)
+    r = client.delete(f"/api/match-requests/{match_id}", headers=mentee.headers)
+    assert r.status_code == 200
+
+def test_match_request_rules(client, make_mentor, make_mentee, make_request):
+    first, second = make_mentor(), make_mentor()
+    mentee, other = make_mentee(), make_mentee()
+    req_id = make_request(mentee, first)
+    post = lambda mentor: client.post(
+        "/api/match-requests", json={"mentorId": mentor.id, "menteeId": mentee.id, "message": "again"}, headers=mentee.headers,
+    )
+    # 같은 멘토에게 다시, 대기 중에 다른 멘토에게 요청할 수 없다
+    assert post(first).json()["detail"] == "Already requested to this mentor"
+    assert post(second).json()["detail"] == "You have a pending request to another mentor"
+    # 다른 멘티 명의로는 보낼 수 없다
+    r = client.post("/api/match-requests", json={"mentorId": first.id, "menteeId": other.id, "message": ""}, headers=mentee.headers)
+    assert r.status_code == 401
+    # 거절되면 다른 멘토에게 요청 가능, 멘토는 한 명만 수락
+    assert client.put(f"/api/match-requests/{req_id}/reject", headers=first.headers).status_code == 200
+    accepted = post(second).json()["id"]
+    waiting = make_request(other, second)
+    assert client.put(f"/api/match-requests/{accepted}/accept", headers=second.headers).status_code == 200
+    r = client.put(f"/api/match-requests/{waiting}/accept", headers=second.headers)
+    assert r.status_code == 400
+    # 다른 멘토의 요청은 건드릴 수 없다
+    assert client.put(f"/api/match-requests/{waiting}/reject", headers=first.headers).status_code == 401
+
+def test_connection_pool_reuse(tmp_path):
+    from db import ConnectionPool
+    pool = ConnectionPool(str(tmp_path / "pool.db"), size=2)
+    conn = pool.acquire()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    # 커밋하지 않은 트랜잭션은 반납 시 롤백된다
+    pool.release(conn)
+    again = pool.acquire()
+    assert again is conn
+    assert again.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.close()
+
+def test_mentor_skill_search(client, make_mentor, make_mentee):
+    mentor = make_mentor(name="스킬멘토", bio="bio-rust", skills=["JavaScript", "Rust"])
+    mentee = make_mentee()
+    # 정확히 일치: Java 는 JavaScript 와 매칭되지 않는다
+    names = lambda r: [m["profile"]["name"] for m in r.json()]
+    assert mentor.name in names(client.get("/api/mentors", params={"skill": "rust"}, headers=mentee.headers))
+    assert mentor.name not in names(client.get("/api/mentors", params={"skill": "Java"}, headers=mentee.headers))
+    assert mentor.name in names(client.get("/api/mentors", params={"skill": "Jav*"}, headers=mentee.headers))
+    # 전문 검색
+    assert names(client.get("/api/mentors", params={"q": "bio-rust"}, headers=mentee.headers)) == [mentor.name]
+
+def test_mentors_keyset_pagination(client, make_mentor, make_mentee):
+    mentee = make_mentee()
+    for i in range(5):
+        make_mentor(name=f"페이지멘토{i % 3}")
+    full = client.get("/api/mentors", params={"orderBy": "name"}, headers=mentee.headers).json()
+    seen, cursor = [], None
+    while True:
+        params = {"orderBy": "name", "limit": 2, "fields": "name"}
+        if cursor:
+            params["cursor"] = cursor
+        r = client.get("/api/mentors", params=params, headers=mentee.headers)
+        assert r.status_code == 200
+        assert all(set(m["profile"]) == {"name"} for m in r.json())
+        if not cursor:
+            assert int(r.headers["X-Total-Count"]) == len(full) == 5
+        seen.extend(m["id"] for m in r.json())
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert seen == [m["id"] for m in full]
+    from pagination import encode_cursor
+    for bad in ("garbage", encode_cursor(["x"]), encode_cursor([{}]), encode_cursor([True])):
+        assert client.get("/api/mentors", params={"limit": 2, "cursor": bad}, headers=mentee.headers).status_code == 400
+    bad = encode_cursor([{}, 1])
+    assert client.get("/api/mentors", params={"orderBy": "name", "limit": 2, "cursor": bad}, headers=mentee.headers).status_code == 400
+
+def test_password_rehash_and_backpressure():
+    import asyncio
+    from passwords import PasswordHasher, HasherBusy
+    old = PasswordHasher(rounds=4, workers=1)
+    new = PasswordHasher(rounds=5, workers=1)
+    async def run():
+        hashed = await old.hash("secret")
+        ok, rehashed = await new.verify("secret", hashed)
+        assert ok and rehashed and "$05$" in rehashed
+        assert await new.verify("secret", rehashed) == (True, None)
+        assert (await new.verify("wrong", rehashed))[0] is False
+        busy = PasswordHasher(rounds=4, workers=1, queue_limit=0)
+        try:
+            await busy.hash("secret")
+            assert False, "HasherBusy expected"
+        except HasherBusy as e:
+            assert e.retry_after >= 1
+    asyncio.run(run())
+
+def test_logout_revokes_token(client, make_mentee):
+    headers = make_mentee().headers
+    assert client.get("/api/me", headers=headers).status_code == 200
+    assert client.post("/api/logout", headers=headers).status_code == 200
+    assert client.get("/api/me", headers=headers).status_code == 401
+
+def test_login_throttle(client, make_mentee, tmp_path, monkeypatch):
+    import main
+    from throttle import LoginThrottle, MemoryBackend, SharedSQLiteBackend
+    mentee = make_mentee()
+    # 버킷 2개짜리 한도로 바꿔서 세 번째 시도부터는 비밀번호가 맞아도 검사 전에 거절
+    monkeypatch.setattr(main, "login_throttle", LoginThrottle(MemoryBackend(), email_limit=(2, 0.001)))
+    creds = {"email": mentee.email, "password": "wrong"}
+    assert client.post("/api/login", json=creds).status_code == 401
+    assert client.post("/api/login", json={"email": "nobody@example.com", "password": "x"}).status_code == 401
+    assert client.post("/api/login", json=creds).status_code == 401
+    r = client.post("/api/login", json=dict(creds, password=mentee.password))
+    assert r.status_code == 429 and int(r.headers["Retry-After"]) >= 1
+    # 워커 사이에서 공유되는 백엔드도 같은 한도, 성공하면 이메일 버킷은 다시 채워진다
+    shared = LoginThrottle(SharedSQLiteBackend(str(tmp_path / "throttle.db")), email_limit=(1, 0.001))
+    shared.check("a@example.com", "10.0.0.1")
+    with pytest.raises(main.LoginThrottled):
+        LoginThrottle(SharedSQLiteBackend(str(tmp_path / "throttle.db")), email_limit=(1, 0.001)).check("A@example.com", "10.0.0.2")
+    shared.succeeded("a@example.com")
+    shared.check("a@example.com", "10.0.0.1")
+
+def test_malformed_tokens_are_unauthorized(client, make_mentee):
+    import base64
+    import json
+    segment = lambda obj: base64.urlsafe_b64encode(json.dumps(obj).encode()).rstrip(b"=").decode()
+    for jti in ([], {}, 1):
+        forged = f"{segment({'alg': 'HS256'})}.{segment({'jti': jti})}.sig"
+        assert client.get("/api/me", headers={"Authorization": f"Bearer {forged}"}).status_code == 401
+    # 캐시에 있는 jti 에 비ASCII 서명을 붙인 토큰
+    token = make_mentee().headers["Authorization"].removeprefix("Bearer ")
+    tampered = token.rsplit(".", 1)[0] + ".서명"
+    assert client.get("/api/me", headers={"Authorization": f"Bearer {tampered}".encode()}).status_code == 401
+
+def test_signing_key_rotation():
+    import jwt
+    from tokens import KeyRing
+    old = KeyRing({"k1": "old-secret"}, "k1")
+    rotated = KeyRing({"k2": "new-secret", "k1": "old-secret"}, "k2")
+    payload = {"iss": "mentor-mentee-app", "aud": "mentor-mentee-client", "exp": 2**31, "jti": "x"}
+    # 이전 키로 서명된 토큰도 교체 후 검증된다
+    assert rotated.decode(old.encode(payload))["jti"] == "x"
+    assert jwt.get_unverified_header(rotated.encode(payload))["kid"] == "k2"
+    with pytest.raises(jwt.InvalidTokenError):
+        KeyRing({"k2": "new-secret"}, "k2").decode(old.encode(payload))
+
+def _png_bytes(size):
+    import io
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (size, size), (200, 120, 40)).save(buf, "PNG")
+    return buf.getvalue()
+
+def test_profile_image_upload(client, make_mentor):
+    import time
+    mentor = make_mentor()
+    headers = mentor.headers
+    r = client.put("/api/profile/image", content=_png_bytes(600), headers={**headers, "Content-Type": "image/png"})
+    assert r.status_code == 200
+    assert r.json()["imageUrl"].startswith("/api/images/mentor/")
+    assert client.put("/api/profile/image", content=b"GIF89a" + b"0" * 100, headers=headers).status_code == 415
+    assert client.put("/api/profile/image", content=b"\x89PNG\r\n\x1a\n" + b"0" * (1024 * 1024), headers=headers).status_code == 413
+    assert client.put("/api/profile/image", content=_png_bytes(300), headers=headers).status_code == 400
+    # 리사이즈는 백그라운드에서 끝난다
+    for _ in range(50):
+        r = client.get(f"/api/images/mentor/{mentor.id}", params={"size": 64}, headers={**headers, "Accept": "image/webp"})
+        if r.headers["content-type"] == "image/webp":
+            break
+        time.sleep(0.1)
+    assert r.headers["content-type"] == "image/webp"
+    r = client.get(f"/api/images/mentor/{mentor.id}", headers=headers)
+    assert r.headers["content-type"] == "image/png"
+    assert r.headers["cache-control"] == "private, no-cache"
+    # 같은 ETag 면 304, 해시가 들어간 URL 은 immutable
+    etag = r.headers["etag"]
+    assert client.get(f"/api/images/mentor/{mentor.id}", headers={**headers, "If-None-Match": etag}).status_code == 304
+    image_url = client.get("/api/me", headers=headers).json()["profile"]["imageUrl"]
+    assert "immutable" in client.get(image_url, headers=headers).headers["cache-control"]
+
+def test_match_events_feed(client, make_mentor, make_mentee, make_request):
+    from events import fetch_match_events, latest_event_id, format_sse
+    mentor = make_mentor()
+    mentee = make_mentee()
+    since = latest_event_id()
+    req_id = make_request(mentee, mentor, "hi")
+    client.put(f"/api/match-requests/{req_id}/reject", headers=mentor.headers)
+    for user_id in (mentor.id, mentee.id):
+        events = fetch_match_events(user_id, since)
+        assert [(e["type"], e["request"]["status"]) for e in events] == [("created", "pending"), ("rejected", "rejected")]
+    # Last-Event-ID 이후부터 재개
+    first = fetch_match_events(mentee.id, since)[0]
+    assert [e["type"] for e in fetch_match_events(mentee.id, first["id"])] == ["rejected"]
+    assert format_sse(first).startswith(f"id: {first['id']}\nevent: created\n")
+    assert client.get("/api/match-requests/events").status_code == 401
+
+def test_match_events_query_uses_primary_keys(fresh_db):
+    import sqlite3
+    from events import MATCH_EVENTS_QUERY
+    conn = sqlite3.connect(fresh_db)
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + MATCH_EVENTS_QUERY, (1, 0, 1, 0, 100))]
+    conn.close()
+    # 메시지는 두 테이블에서 기본 키로 찾고, 보관 포함 뷰를 만들거나 스캔하지 않는다
+    assert any(d.startswith("SEARCH r USING INTEGER PRIMARY KEY") for d in plan)
+    assert any(d.startswith("SEARCH ra USING INTEGER PRIMARY KEY") for d in plan)
+    assert not any("SCAN" in d or "MATERIALIZE" in d or "CO-ROUTINE" in d for d in plan), plan
+
+def test_event_broker_wakes_only_affected_users(make_mentor, make_mentee, make_request):
+    import asyncio
+    from events import EventBroker
+    mentor, other = make_mentor(), make_mentor()
+    mentee = make_mentee()
+
+    async def run():
+        broker = EventBroker()
+        waiters = {user.id: broker.subscribe(user.id)[1] for user in (mentor, other, mentee)}
+        await asyncio.sleep(0.05)
+        for event in waiters.values():
+            event.clear()
+        await asyncio.to_thread(make_request, mentee, mentor)
+        broker.notify()
+        await asyncio.sleep(0.1)
+        return {user_id: event.is_set() for user_id, event in waiters.items()}
+
+    assert asyncio.run(run()) == {mentor.id: True, other.id: False, mentee.id: True}
+
+def test_concurrent_accepts_only_one_wins(client, make_mentor, make_mentee):
+    from concurrent.futures import ThreadPoolExecutor
+    mentor = make_mentor()
+    request_ids = []
+    for i in range(4):
+        mentee = make_mentee()
+        req = {"mentorId": mentor.id, "menteeId": mentee.id, "message": "race"}
+        # 같은 요청을 동시에 여러 번 보내도 하나만 생성된다
+        with ThreadPoolExecutor(4) as pool:
+            codes = list(pool.map(lambda _: client.post("/api/match-requests", json=req, headers=mentee.headers), range(4)))
+        created = [r for r in codes if r.status_code == 200]
+        assert len(created) == 1
+        request_ids.append(created[0].json()["id"])
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda i: client.put(f"/api/match-requests/{i}/accept", headers=mentor.headers), request_ids))
+    assert sorted(r.status_code for r in results) == [200, 400, 400, 400]
+    incoming = client.get("/api/match-requests/incoming", headers=mentor.headers).json()
+    assert [r["status"] for r in incoming].count("accepted") == 1
+
+def test_mentor_list_cache_invalidation(client, make_mentor, make_mentee):
+    from cache import mentor_cache
+    mentor = make_mentor(name="캐시멘토")
+    mentee = make_mentee()
+    params = {"orderBy": "name", "fields": "name,bio"}
+    client.get("/api/mentors", params=params, headers=mentee.headers)
+    hits = mentor_cache.hits
+    r = client.get("/api/mentors", params=params, headers=mentee.headers)
+    assert r.headers["X-Cache"] == "HIT" and mentor_cache.hits == hits + 1
+    # 멘토 프로필이 바뀌면 다음 조회는 새로 계산
+    client.put("/api/profile", json={"id": 0, "name": "캐시멘토", "role": "mentor", "bio": "새 소개", "image": "", "skills": []}, headers=mentor.headers)
+    r = client.get("/api/mentors", params=params, headers=mentee.headers)
+    assert r.headers["X-Cache"] == "MISS"
+    assert r.json()[0]["profile"] == {"name": "캐시멘토", "bio": "새 소개"}
+
+def test_shared_cache_backend(tmp_path):
+    from cache import SharedSQLiteBackend, ResponseCache
+    path = str(tmp_path / "cache.db")
+    worker_a = ResponseCache("mentors", SharedSQLiteBackend(path))
+    worker_b = ResponseCache("mentors", SharedSQLiteBackend(path))
+    key = worker_a.key(skill="python")
+    worker_a.set(key, b"[]", {"X-Total-Count": "0"})
+    assert worker_b.get(worker_b.key(skill="python")) == (b"[]", {"X-Total-Count": "0"})
+    # 한 워커의 무효화가 다른 워커에도 반영된다
+    worker_a.invalidate()
+    assert worker_b.get(worker_b.key(skill="python")) is None
+
+def test_shared_files_are_per_database(monkeypatch):
+    import db
+    monkeypatch.setattr(db, "DB_PATH", "/srv/staging/app.db")
+    staging = db.shared_file_path("cache")
+    monkeypatch.setattr(db, "DB_PATH", "/srv/prod/app.db")
+    assert db.shared_file_path("cache") != staging
+    assert db.shared_file_path("cache") != db.shared_file_path("throttle")
+
+def test_metrics_endpoint(client, make_mentee, monkeypatch):
+    import main
+    from metrics import statement_label
+    headers = make_mentee().headers
+    client.get("/api/mentors", params={"skill": "Vue"}, headers=headers)
+    client.get("/api/does-not-exist")
+    # 토큰을 설정하지 않으면 열리지 않는다
+    assert client.get("/api/metrics").status_code == 404
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape")
+    assert client.get("/api/metrics").status_code == 401
+    body = client.get("/api/metrics", headers={"Authorization": "Bearer scrape"}).text
+    assert 'http_requests_total{method="GET",route="/api/mentors",status="200"}' in body
+    assert 'route="unmatched",status="404"' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/mentors",le="+Inf"}' in body
+    assert "db_query_duration_seconds_count{statement=" in body
+    assert "mentor_cache_misses_total" in body
+    # IN 목록 길이가 달라도 같은 라벨
+    assert statement_label("SELECT 1 WHERE id IN (?, ?)") == statement_label("SELECT 1 WHERE id IN (?,?,?)") == "SELECT 1 WHERE id IN (?…)"
+
+def test_migrations_are_versioned(tmp_path):
+    import sqlite3
+    from migrations import migrate, LATEST_VERSION
+    path = str(tmp_path / "migrate.db")
+    assert migrate(path) == LATEST_VERSION
+    # 다시 실행해도 추가로 적용되는 것이 없다
+    assert migrate(path) == LATEST_VERSION
+    conn = sqlite3.connect(path)
+    versions = [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == list(range(1, LATEST_VERSION + 1))
+    assert conn.execute("SELECT 1 FROM sqlite_master WHERE name='ux_match_requests_pair_active'").fetchone()
+    conn.close()
+
+def test_legacy_image_migration_survives_rollback(tmp_path, monkeypatch):
+    import os
+    import sqlite3
+    import migrations
+    path = str(tmp_path / "legacy.db")
+    full = migrations.MIGRATIONS
+    monkeypatch.setattr(migrations, "MIGRATIONS", full[:5])
+    monkeypatch.setattr(migrations, "LATEST_VERSION", 5)
+    migrations.migrate(path)
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (id, email, password, name, role) VALUES (77, 'legacy@example.com', 'x', 'legacy', 'mentor')")
+    conn.execute("INSERT INTO mentor_profiles (user_id, bio, image_url, skills) VALUES (77, '', '/images/mentor/77', '')")
+    conn.commit()
+    legacy = os.path.join(migrations.STATIC_DIR, "mentor_77.png")
+    os.makedirs(migrations.STATIC_DIR, exist_ok=True)
+    with open(legacy, "wb") as f:
+        f.write(_png_bytes(8))
+
+    def broken(c):
+        raise RuntimeError("boom")
+
+    # 뒤 단계가 실패해서 롤백되면 원본 파일은 그대로 남는다
+    monkeypatch.setattr(migrations, "MIGRATIONS", full + [(99, broken)])
+    monkeypatch.setattr(migrations, "LATEST_VERSION", 99)
+    with pytest.raises(RuntimeError):
+        migrations.migrate(path)
+    assert os.path.exists(legacy)
+    monkeypatch.setattr(migrations, "MIGRATIONS", full)
+    monkeypatch.setattr(migrations, "LATEST_VERSION", full[-1][0])
+    migrations.migrate(path)
+    digest = conn.execute("SELECT image_hash FROM mentor_profiles WHERE user_id=77").fetchone()[0]
+    assert digest and not os.path.exists(legacy)
+    conn.close()
+
+def test_async_database_read_write(tmp_path):
+    import asyncio
+    from db import AsyncDatabase
+    db = AsyncDatabase(str(tmp_path / "async.db"), readers=2)
+
+    def create(conn):
+        conn.execute("CREATE TABLE t (n INTEGER)")
+        conn.commit()
+
+    def insert(conn, n):
+        conn.execute("INSERT INTO t VALUES (?)", (n,))
+        conn.commit()
+
+    def insert_then_fail(conn):
+        conn.execute("INSERT INTO t VALUES (-1)")
+        raise ValueError("boom")
+
+    def total(conn):
+        return conn.execute("SELECT COUNT(*), COALESCE(MIN(n), 0) FROM t").fetchone()[:]
+
+    async def run():
+        await db.write(create)
+        await asyncio.gather(*(db.write(insert, n) for n in range(50)))
+        # 실패한 작업의 미완료 트랜잭션은 롤백된다
+        with pytest.raises(ValueError):
+            await db.write(insert_then_fail)
+        return await asyncio.gather(*(db.read(total) for _ in range(10)))
+
+    try:
+        assert set(asyncio.run(run())) == {(50, 0)}
+    finally:
+        db.close()
+
+def test_recommended_mentors(client, make_mentor, make_mentee, make_request):
+    make_mentor(bio="프론트엔드", skills=["Vue"])
+    mentor = make_mentor(name="추천멘토", bio="함수형 프로그래밍", skills=["Elixir", "Erlang"])
+    # 요청 이력이 없는 새 멘티
+    mentee = make_mentee(bio="Elixir 를 배우고 싶어요")
+    r = client.get("/api/mentors/recommended", params={"limit": 5}, headers=mentee.headers)
+    assert r.status_code == 200
+    assert r.json()[0]["id"] == mentor.id and r.json()[0]["profile"]["skills"] == ["Elixir", "Erlang"]
+    # 프로필 수정은 색인에 바로 반영된다
+    client.put("/api/profile", json={"id": mentor.id, "name": "추천멘토", "role": "mentor", "bio": "", "image": "", "skills": ["Cobol"]}, headers=mentor.headers)
+    r = client.get("/api/mentors/recommended", params={"limit": 100}, headers=mentee.headers)
+    assert r.json()[0]["id"] != mentor.id
+    # 진행 중인 요청이 있는 멘토는 추천하지 않는다
+    client.put("/api/profile", json={"id": mentor.id, "name": "추천멘토", "role": "mentor", "bio": "", "image": "", "skills": ["Elixir"]}, headers=mentor.headers)
+    make_request(mentee, mentor, "hi")
+    r = client.get("/api/mentors/recommended", params={"limit": 100}, headers=mentee.headers)
+    assert mentor.id not in [m["id"] for m in r.json()]
+    assert client.get("/api/mentors/recommended", headers=mentor.headers).status_code == 401
+
+def test_bulk_import_export(tmp_path):
+    import io
+    import bulk
+    from db import open_connection
+    from migrations import migrate
+    path = str(tmp_path / "bulk.db")
+    migrate(path)
+    conn = open_connection(path)
+    source = io.StringIO(
+        "email,name,role,password,bio,skills\n"
+        "m1@example.com,멘토1,mentor,pw1,소개,\"Python,python,Go\"\n"
+        "e1@example.com,멘티1,mentee,pw2,,\n"
+        "bad,이름,mentee,pw,,\n"
+        "e2@example.com,멘티2,admin,pw,,\n"
+        "m1@example.com,중복,mentor,pw,,\n"
+    )
+    errors = []
+    imported = bulk.import_users(source, "csv", conn, lambda *e: errors.append(e), rounds=4, workers=2, batch_size=2)
+    assert imported == 2
+    assert sorted(line for line, _, _ in errors) == [4, 5, 6]
+    assert conn.execute("SELECT skill FROM mentor_skills ORDER BY skill").fetchall()[0][0] == "Go"
+    out = io.StringIO()
+    assert bulk.export_rows(conn, "users", out, "jsonl", include_password_hash=True) == 2
+    conn.close()
+    # 내보낸 해시로 다른 DB 에 다시 가져오면 해시 계산 없이 같은 비밀번호로 로그인 가능
+    other = str(tmp_path / "other.db")
+    migrate(other)
+    conn = open_connection(other)
+    out.seek(0)
+    assert bulk.import_users(out, "jsonl", conn, lambda *e: errors.append(e), rounds=4, workers=1) == 2
+    row = conn.execute("SELECT password FROM users WHERE email='m1@example.com'").fetchone()
+    from passlib.hash import bcrypt
+    assert bcrypt.verify("pw1", row[0])
+    conn.close()
+
+def test_bulk_import_invalidates_shared_cache(tmp_path, monkeypatch):
+    import bulk
+    from cache import ResponseCache, SharedSQLiteBackend
+    from db import shared_file_path
+    db_path = str(tmp_path / "served.db")
+    # 같은 DB 를 쓰는 서버 워커의 공유 캐시
+    server = ResponseCache("mentors", SharedSQLiteBackend(str(tmp_path / "cache.db")))
+    server.set(server.key(), b"[]", {})
+    monkeypatch.setattr(bulk, "CACHE_BACKEND", "memory")
+    assert bulk.invalidate_server_cache(db_path) is False
+    monkeypatch.setattr(bulk, "CACHE_BACKEND", "shared")
+    monkeypatch.setenv("RESPONSE_CACHE_PATH", str(tmp_path / "cache.db"))
+    assert bulk.invalidate_server_cache(db_path) is True
+    assert server.get(server.key()) is None
+    assert shared_file_path("cache", db_path) != shared_file_path("cache", str(tmp_path / "other.db"))
+
+def test_batch_match_request_actions(client, make_mentor, make_mentee, make_request):
+    mentor = make_mentor()
+    request_ids = [make_request(make_mentee(), mentor, "batch") for _ in range(3)]
+    first, second, third = request_ids
+    r = client.post("/api/match-requests/batch", json={"actions": [
+        {"id": first, "action": "reject"},
+        {"id": second, "action": "accept"},
+        {"id": third, "action": "accept"},
+        {"id": 10**9, "action": "reject"},
+        {"id": first, "action": "cancel"},
+    ]}, headers=mentor.headers)
+    assert r.status_code == 200
+    assert [(x["ok"], x["status"]) for x in r.json()["results"]] == [
+        (True, 200), (True, 200), (False, 400), (False, 404), (False, 401),
+    ]
+    statuses = {x["id"]: x["status"] for x in client.get("/api/match-requests/incoming", headers=mentor.headers).json()}
+    assert [statuses[i] for i in request_ids] == ["rejected", "accepted", "pending"]
+
+def test_archive_terminal_match_requests(client, make_mentor, make_mentee, make_request):
+    from archive import archive_batch, compact
+    from db import connection
+    mentor = make_mentor()
+    mentee = make_mentee()
+    req_id = make_request(mentee, mentor, "old")
+    assert client.put(f"/api/match-requests/{req_id}/reject", headers=mentor.headers).status_code == 200
+    with connection() as conn:
+        # 오래전에 거절된 것처럼 만들고 그보다 최근을 기준으로 보관
+        conn.execute("UPDATE match_requests SET status_changed_at=1 WHERE id=?", (req_id,))
+        conn.commit()
+        assert archive_batch(conn, 2) == 1
+        assert archive_batch(conn, 2) == 0
+        compact(conn)
+    assert client.get("/api/match-requests/incoming", headers=mentor.headers).json() == []
+    r = client.get("/api/match-requests/outgoing", params={"include_archived": "true", "limit": 10}, headers=mentee.headers)
+    assert [(x["id"], x["status"]) for x in r.json()] == [(req_id, "rejected")]
+    assert r.headers["X-Total-Count"] == "1"
+    # 보관된 요청은 더 이상 상태를 바꿀 수 없다
+    assert client.delete(f"/api/match-requests/{req_id}", headers=mentee.headers).status_code == 404
+
+def test_read_snapshot_replica(client, make_mentor, make_mentee, tmp_path, monkeypatch):
+    import main
+    from replica import SnapshotReplica
+    (tmp_path / "snapshots").mkdir()
+    snapshots = SnapshotReplica(enabled=True, max_staleness=60, directory=str(tmp_path / "snapshots"))
+    monkeypatch.setattr(main, "replica", snapshots)
+    mentor = make_mentor(name="스냅샷멘토")
+    mentee = make_mentee()
+    snapshots.refresh()
+    profile = {"id": 0, "name": "스냅샷멘토", "role": "mentor", "bio": "바뀐 소개", "image": "", "skills": []}
+    client.put("/api/profile", json=profile, headers=mentor.headers)
+    # 쓴 사용자는 바로 자기 변경을 보고, 다른 사용자는 다음 스냅샷까지 이전 내용을 본다
+    assert client.get("/api/me", headers=mentor.headers).json()["profile"]["bio"] == "바뀐 소개"
+    bios = lambda: [m["profile"]["bio"] for m in client.get("/api/mentors", params={"fields": "bio"}, headers=mentee.headers).json()]
+    assert bios() == [""]
+    snapshots.refresh()
+    assert bios() == ["바뀐 소개"]
+    # 받아 간 스냅샷은 한 번 교체된 뒤에도 남아 있고, 그 뒤에 지워져도 app.db 로 읽는다
+    import asyncio
+    import os
+    from db import database
+    old = snapshots.current()
+    count = lambda conn: conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+    snapshots.refresh()
+    assert asyncio.run(database.read(count, snapshot=old)) == 2
+    old = snapshots.current()
+    snapshots.refresh()
+    snapshots.refresh()
+    assert not os.path.exists(old.path)
+    assert asyncio.run(database.read(count, snapshot=old)) == 2
+    assert snapshots.current() is not None
+    # 최대 지연을 넘은 스냅샷은 쓰지 않는다
+    snapshots.max_staleness = 0
+    assert snapshots.current() is None
+    snapshots.close()
+    assert not list((tmp_path / "snapshots").iterdir())
+
+def test_profile_etag(client, make_mentor, make_mentee):
+    mentor = make_mentor(name="버전멘토", skills=["Go"])
+    mentee = make_mentee()
+    r = client.get("/api/me", headers=mentor.headers)
+    etag = r.headers["etag"]
+    assert r.headers["cache-control"] == "private, no-cache"
+    assert client.get("/api/me", headers={**mentor.headers, "If-None-Match": etag}).status_code == 304
+    # 같은 ETag 를 다른 사용자가 보내도 304 가 아니다
+    assert client.get("/api/me", headers={**mentee.headers, "If-None-Match": etag}).status_code == 200
+    # 멘토 프로필 조회도 같은 버전을 쓴다
+    r = client.get(f"/api/mentors/{mentor.id}", headers=mentee.headers)
+    assert r.json()["profile"] == {"name": "버전멘토", "bio": "", "imageUrl": None, "skills": ["Go"]}
+    assert r.headers["etag"] == etag
+    assert client.get(f"/api/mentors/{mentor.id}", headers={**mentee.headers, "If-None-Match": etag}).status_code == 304
+    assert client.get(f"/api/mentors/{mentee.id}", headers=mentee.headers).status_code == 404
+    # 프로필이 바뀌면 버전이 올라가서 전체 응답
+    client.put("/api/profile", json={"id": mentor.id, "name": "버전멘토", "role": "mentor", "bio": "새 소개", "image": "", "skills": ["Go"]}, headers=mentor.headers)
+    r = client.get("/api/me", headers={**mentor.headers, "If-None-Match": etag})
+    assert r.status_code == 200 and r.json()["profile"]["bio"] == "새 소개"
+    assert r.headers["etag"] != etag
@@ -0,0 +1,169 @@
+# 로그인 시도 제한 (이메일/클라이언트 IP 별 토큰 버킷)
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from db import shared_file_path
+
+# memory: 프로세스 내 (워커 1개일 때), shared: 워커들이 같이 쓰는 SQLite 파일
+THROTTLE_BACKEND = os.environ.get("LOGIN_THROTTLE_BACKEND", "memory")
+# 버킷 크기(연속 시도 허용 수)와 초당 충전량
+EMAIL_BURST = float(os.environ.get("LOGIN_EMAIL_BURST", "10"))
+EMAIL_RATE = float(os.environ.get("LOGIN_EMAIL_RATE", str(1 / 30)))
+IP_BURST = float(os.environ.get("LOGIN_IP_BURST", "100"))
+IP_RATE = float(os.environ.get("LOGIN_IP_RATE", "1"))
+# memory 백엔드가 들고 있는 최대 키 수. 오래 안 쓴 키부터 버린다 (버려진 키는 가득 찬 버킷과 같음)
+THROTTLE_SIZE = int(os.environ.get("LOGIN_THROTTLE_SIZE", "100000"))
+# 기본 파일은 DB 경로별 (같은 호스트의 다른 인스턴스와 버킷을 공유하지 않음)
+SHARED_THROTTLE_PATH = os.environ.get("LOGIN_THROTTLE_PATH") or shared_file_path("throttle")
+
+
+class LoginThrottled(Exception):
+    def __init__(self, retry_after):
+        super().__init__("Too many login attempts")
+        self.retry_after = retry_after
+
+
+def refill(tokens, updated, now, burst, rate):
+    return min(burst, tokens + (now - updated) * rate)
+
+
+def take_all(state, buckets, now):
+    """buckets: (key, burst, rate). 모든 버킷에 토큰이 있으면 하나씩 꺼내고 0,
+    하나라도 비었으면 아무것도 꺼내지 않고 기다려야 할 초를 반환한다.
+    state 는 key → (토큰 수, 갱신 시각) 을 읽고 쓰는 (get, put) 쌍."""
+    get, put = state
+    current = []
+    wait = 0.0
+    for key, burst, rate in buckets:
+        found = get(key)
+        tokens = burst if found is None else refill(found[0], found[1], now, burst, rate)
+        if tokens < 1:
+            wait = max(wait, (1 - tokens) / rate)
+        current.append((key, tokens))
+    if wait:
+        return wait
+    for key, tokens in current:
+        put(key, tokens - 1, now)
+    return 0.0
+
+
+class MemoryBackend:
+    # 락만 잡고 끝나므로 이벤트 루프에서 바로 호출해도 된다
+    in_process = True
+
+    def __init__(self, maxsize=THROTTLE_SIZE):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        return self._buckets.get(key)
+
+    def _put(self, key, tokens, updated):
+        self._buckets[key] = (tokens, updated)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+
+    def take(self, buckets):
+        with self._lock:
+            return take_all((self._get, self._put), buckets, time.monotonic())
+
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+class SharedSQLiteBackend:
+    """여러 uvicorn 워커가 같은 한도를 공유한다. 기본 위치는 /dev/shm (메모리 파일시스템).
+
+    확인과 차감을 BEGIN IMMEDIATE 안에서 해서 워커 사이에서도 토큰이 중복으로 나가지 않는다.
+    """
+
+    in_process = False
+
+    def __init__(self, path=SHARED_THROTTLE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, timeout=1.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, buckets):
+        conn = self._conn()
+
+        def get(key):
+            return conn.execute("SELECT tokens, updated FROM buckets WHERE key=?", (key,)).fetchone()
+
+        def put(key, tokens, updated):
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)", (key, tokens, updated)
+            )
+
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            wait = take_all((get, put), buckets, now)
+            self._writes += 1
+            if self._writes % 256 == 0:
+                # 이미 가득 찼을 만큼 오래된 버킷은 없는 것과 같으므로 정리
+                idle = max(burst / rate for _, burst, rate in buckets)
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - idle,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def reset(self, key):
+        self._conn().execute("DELETE FROM buckets WHERE key=?", (key,))
+
+
+def make_backend(kind=THROTTLE_BACKEND):
+    if kind == "shared":
+        return SharedSQLiteBackend()
+    if kind == "memory":
+        return MemoryBackend()
+    raise RuntimeError(f"Unknown LOGIN_THROTTLE_BACKEND {kind!r}")
+
+
+class LoginThrottle:
+    """로그인 시도마다 이메일 버킷과 IP 버킷에서 토큰을 하나씩 꺼낸다.
+
+    둘 중 하나라도 비어 있으면 DB 조회나 bcrypt 전에 LoginThrottled (429) 로 거절한다.
+    로그인에 성공하면 그 이메일의 버킷은 다시 가득 찬 상태로 돌린다 (IP 버킷은 유지).
+    """
+
+    def __init__(self, backend, email_limit=(EMAIL_BURST, EMAIL_RATE), ip_limit=(IP_BURST, IP_RATE)):
+        self.backend = backend
+        self.email_limit = email_limit
+        self.ip_limit = ip_limit
+        self.rejected = 0
+
+    def check(self, email, ip):
+        wait = self.backend.take([
+            (f"email:{email.lower()}", *self.email_limit),
+            (f"ip:{ip}", *self.ip_limit),
+        ])
+        if wait:
+            self.rejected += 1
+            raise LoginThrottled(max(1, math.ceil(wait)))
+
+    def succeeded(self, email):
+        self.backend.reset(f"email:{email.lower()}")
+
+
+login_throttle = LoginThrottle(make_backend())
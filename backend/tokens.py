@@ -0,0 +1,217 @@
+# JWT 발급/검증 (서명 키 교체, 검증 결과 캐시, 폐기 목록)
+import base64
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import jwt
+from db import connection
+
+logger = logging.getLogger(__name__)
+
+ISSUER = "mentor-mentee-app"
+AUDIENCE = "mentor-mentee-client"
+ALGORITHM = "HS256"
+TOKEN_TTL = 3600
+
+TOKEN_CACHE_SIZE = int(os.environ.get("TOKEN_CACHE_SIZE", "10000"))
+# 캐시 항목 최대 수명. 다른 워커에서 폐기된 토큰도 이 시간 안에 반영된다
+TOKEN_CACHE_TTL = int(os.environ.get("TOKEN_CACHE_TTL", "60"))
+
+
+def load_signing_keys():
+    """JWT_KEYS="kid1:secret1,kid2:secret2" 와 JWT_ACTIVE_KID 로 서명 키를 구성한다.
+
+    설정이 없으면 JWT_SECRET (기본값: 개발용 키) 하나를 "default" kid 로 쓴다.
+    새 토큰은 활성 키로 서명하고, 목록에 남아 있는 이전 키로 서명된 토큰도 검증된다.
+    """
+    keys = {}
+    for item in os.environ.get("JWT_KEYS", "").split(","):
+        if ":" in item:
+            kid, secret = item.split(":", 1)
+            keys[kid.strip()] = secret.strip()
+    if not keys:
+        keys = {"default": os.environ.get("JWT_SECRET", "dev-secret")}
+    active = os.environ.get("JWT_ACTIVE_KID") or next(iter(keys))
+    if active not in keys:
+        raise RuntimeError(f"JWT_ACTIVE_KID {active!r} is not in JWT_KEYS")
+    return keys, active
+
+
+class KeyRing:
+    def __init__(self, keys, active_kid):
+        self.keys = keys
+        self.active_kid = active_kid
+
+    def encode(self, payload):
+        return jwt.encode(payload, self.keys[self.active_kid], algorithm=ALGORITHM, headers={"kid": self.active_kid})
+
+    def decode(self, token):
+        kid = jwt.get_unverified_header(token).get("kid")
+        # kid 없는 토큰은 키 교체 이전에 발급된 것 → 활성 키로 검증
+        secret = self.keys.get(kid) if kid else self.keys[self.active_kid]
+        if secret is None:
+            raise jwt.InvalidTokenError(f"Unknown signing key {kid!r}")
+        return jwt.decode(
+            token, secret, algorithms=[ALGORITHM], audience=AUDIENCE, issuer=ISSUER,
+            options={"require": ["exp", "jti"]},
+        )
+
+
+class TokenCache:
+    """jti → 검증된 payload LRU 캐시. 항목은 exp 또는 TTL 중 이른 시점에 만료된다.
+
+    같은 jti 라도 토큰 문자열이 다르면 캐시를 쓰지 않는다.
+    """
+
+    def __init__(self, maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, jti, token):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(jti)
+            if entry is None:
+                return None
+            cached_token, payload, expires_at = entry
+            if expires_at <= now:
+                del self._entries[jti]
+                return None
+            # str 끼리 비교하면 비ASCII 문자가 있을 때 TypeError
+            if not hmac.compare_digest(cached_token.encode(), token.encode()):
+                return None
+            self._entries.move_to_end(jti)
+            return payload
+
+    def put(self, jti, token, payload):
+        expires_at = min(payload["exp"], time.time() + self.ttl)
+        with self._lock:
+            self._entries[jti] = (token, payload, expires_at)
+            self._entries.move_to_end(jti)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, jti):
+        with self._lock:
+            self._entries.pop(jti, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class RevocationList:
+    # 폐기된 jti → exp. exp 가 지난 항목은 어차피 검증에서 걸러지므로 정리한다
+    def __init__(self):
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti):
+        return jti in self._revoked
+
+    def add(self, jti, exp):
+        with self._lock:
+            self._revoked[jti] = exp
+
+    def prune(self, now=None):
+        now = now or time.time()
+        with self._lock:
+            self._revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+
+
+keyring = KeyRing(*load_signing_keys())
+token_cache = TokenCache()
+revocations = RevocationList()
+
+
+def issue_token(user_id, name, email, role):
+    now = int(time.time())
+    payload = {
+        "iss": ISSUER,
+        "sub": str(user_id),
+        "user_id": user_id,
+        "aud": AUDIENCE,
+        "exp": now + TOKEN_TTL,
+        "nbf": now,
+        "iat": now,
+        "jti": str(uuid.uuid4()),
+        "name": name,
+        "email": email,
+        "role": role,
+    }
+    return keyring.encode(payload)
+
+
+def unverified_jti(token):
+    # 캐시 조회용: 서명 검증 없이 payload 의 jti 만 꺼낸다 (위조 토큰일 수 있으므로 문자열이 아니면 무효)
+    try:
+        segment = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+    except (IndexError, ValueError):
+        return None
+    jti = claims.get("jti") if isinstance(claims, dict) else None
+    return jti if isinstance(jti, str) else None
+
+
+def verify_token(token):
+    """토큰을 검증해서 payload 를 반환한다. 폐기/무효 토큰이면 None.
+
+    캐시 히트 시 서명 검증과 DB 조회를 모두 건너뛴다. 동기 함수이므로
+    이벤트 루프에서는 run_in_threadpool 로 호출한다 (캐시 미스 시 DB 조회).
+    """
+    jti = unverified_jti(token)
+    if not jti or jti in revocations:
+        return None
+    payload = token_cache.get(jti, token)
+    if payload is not None:
+        return payload
+    try:
+        payload = keyring.decode(token)
+    except jwt.InvalidTokenError as e:
+        logger.debug("Rejected token: %s", e)
+        return None
+    if payload["jti"] != jti:
+        return None
+    if is_revoked_in_db(jti):
+        revocations.add(jti, payload["exp"])
+        return None
+    token_cache.put(jti, token, payload)
+    return payload
+
+
+def cached_token_payload(token):
+    # 이벤트 루프에서 바로 호출 가능한 캐시 전용 조회 (미스면 None)
+    jti = unverified_jti(token)
+    if not jti or jti in revocations:
+        return None
+    return token_cache.get(jti, token)
+
+
+def is_revoked_in_db(jti):
+    with connection() as conn:
+        return conn.execute("SELECT 1 FROM revoked_tokens WHERE jti=?", (jti,)).fetchone() is not None
+
+
+def revoke_token(payload):
+    jti, exp = payload["jti"], payload["exp"]
+    with connection() as conn:
+        conn.execute("INSERT OR IGNORE INTO revoked_tokens (jti, exp) VALUES (?, ?)", (jti, exp))
+        conn.execute("DELETE FROM revoked_tokens WHERE exp < ?", (int(time.time()),))
+        conn.commit()
+    revocations.add(jti, exp)
+    revocations.prune()
+    token_cache.discard(jti)
+
+
+def load_revocations():
+    # 시작 시 아직 유효한 폐기 목록을 메모리로 읽어 온다
+    with connection() as conn:
+        rows = conn.execute("SELECT jti, exp FROM revoked_tokens WHERE exp >= ?", (int(time.time()),)).fetchall()
+    for jti, exp in rows:
+        revocations.add(jti, exp)